@@ -0,0 +1,360 @@
+"""
+Benchmarks on synthetic data.
+
+Hash cache backends against the same workload:
+
+    python -m MeGaLoSorTer.bench --rows 100000
+
+Peak RSS of a --low-memory run over a generated ROM set:
+
+    python -m MeGaLoSorTer.bench --rom-set 200000
+
+Launcher writes, one at a time and from the writer's thread pool (point
+--dir at an SMB/NFS mount; the two trees must come out identical):
+
+    python -m MeGaLoSorTer.bench --writes 5000 --dir /mnt/nas/tmp
+
+Peak RSS of normal runs as the library grows (should stay flat):
+
+    python -m MeGaLoSorTer.bench --stress 10000 100000 1000000
+
+Deterministic check of the I/O throttle against a simulated clock:
+
+    python -m MeGaLoSorTer.bench --throttle
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .cachestore import BACKENDS, CacheRow, open_backend
+from .throttle import BURST_SECONDS, IoThrottle
+from .writer import LauncherWriter
+
+
+def synthetic_rows(n: int) -> List[CacheRow]:
+    rows = []
+    for i in range(n):
+        digest = hashlib.sha1(str(i).encode()).hexdigest()
+        rows.append(
+            CacheRow(
+                path=f"/media/usb0/games/System{i % 45}/nointro/Game {i} (USA).bin",
+                size=65536 + i,
+                mtime=1_700_000_000.0 + i,
+                sha1=digest,
+                dev=42,
+                ino=1000 + i,
+                sha1_nh="" if i % 2 else digest,
+                fp=digest,
+            )
+        )
+    return rows
+
+
+def bench_backend(kind: str, rows: List[CacheRow], workdir: Path) -> Dict[str, float]:
+    path = workdir / f"cache.{kind}"
+    timings: Dict[str, float] = {}
+
+    def timed(name: str, fn: Callable[[], object]) -> object:
+        t0 = time.perf_counter()
+        out = fn()
+        timings[name] = time.perf_counter() - t0
+        return out
+
+    store = timed("open", lambda: open_backend(kind, path))
+
+    def put_all() -> None:
+        for row in rows:
+            store.put(row)
+
+    timed("put", put_all)
+    timed("close", store.close)
+
+    store = timed("reopen", lambda: open_backend(kind, path))
+    if kind == "memory":
+        # Nothing persisted: measure lookups against a warm store instead.
+        put_all()
+
+    def get_all() -> None:
+        for row in rows:
+            store.get(row.path)
+
+    def find_all() -> None:
+        for row in rows:
+            store.find_inode(row.dev, row.ino, row.size, row.mtime, False)
+
+    timed("get", get_all)
+    timed("find_inode", find_all)
+    store.close()
+    return timings
+
+
+def make_rom_set(
+    root: Path, n: int, per_dir: int = 500, csv_rows: Optional[int] = None
+) -> Path:
+    """
+    n tiny .md ROMs, `per_dir` per folder, and a CSV matching every other
+    one (only the first `csv_rows` of them, if given).
+    """
+    romdir = root / "ROMS"
+    csv_path = root / "synthetic.csv"
+    with csv_path.open("w", encoding="utf-8", newline="") as f:
+        f.write("SHA1,Screen title @ Exact,ID,Region,Release date,Publisher,Tags\n")
+        for i in range(n):
+            folder = romdir / f"set{i // per_dir:05d}"
+            if i % per_dir == 0:
+                folder.mkdir(parents=True)
+            data = f"synthetic rom {i}".encode()
+            (folder / f"Game {i} (USA).md").write_bytes(data)
+            if i % 2 == 0 and (csv_rows is None or i < 2 * csv_rows):
+                sha1 = hashlib.sha1(data).hexdigest()
+                f.write(
+                    f"{sha1},Game {i},S{i},USA,19{90 + i % 10},"
+                    f"Pub{i % 97},#genre:action\n"
+                )
+    return csv_path
+
+
+def run_cli(workdir: Path, csv_path: Path, *options: str) -> Tuple[int, str]:
+    """Run the CLI over workdir/ROMS in a child process; (exit code, stdout)."""
+    package_dir = Path(__file__).resolve().parent
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(package_dir.parent), env.get("PYTHONPATH")])
+    )
+    cmd = [
+        sys.executable,
+        "-m",
+        f"{package_dir.name}.cli",
+        "--csv",
+        str(csv_path),
+        "--romdir",
+        str(workdir / "ROMS"),
+        "--outdir",
+        str(workdir / "out"),
+        "--cache",
+        str(workdir / "hashcache.sqlite"),
+        "--write-unmatched",
+        *options,
+    ]
+    proc = subprocess.run(cmd, cwd=workdir, env=env, stdout=subprocess.PIPE, text=True)
+    return proc.returncode, proc.stdout
+
+
+def bench_rom_set(n: int, workdir: Path) -> int:
+    """Run the CLI with --low-memory in a child process and show its summary."""
+    print(f"[BENCH] generating {n:,} ROMs in {workdir}")
+    csv_path = make_rom_set(workdir, n)
+    code, out = run_cli(workdir, csv_path, "--low-memory")
+    print(out, end="")
+    return code
+
+
+def bench_stress(sizes: List[int], workdir: Path) -> int:
+    """
+    Peak RSS of a normal run over growing ROM sets. The CSV is the same
+    1,000 entries for every size, so any growth comes from the scan, hash
+    and write path; it should stay flat.
+    """
+    print("[BENCH] peak RSS by library size (normal mode, 1,000-entry CSV)")
+    for n in sizes:
+        root = workdir / f"set{n}"
+        root.mkdir()
+        csv_path = make_rom_set(root, n, csv_rows=1000)
+        start = time.perf_counter()
+        code, out = run_cli(root, csv_path)
+        elapsed = time.perf_counter() - start
+        if code:
+            print(out, end="")
+            return code
+        peak = next(
+            (line.split(":", 1)[1].strip() for line in out.splitlines()
+             if line.strip().startswith("peak RSS:")),
+            "n/a",
+        )
+        print(f"  {n:>10,} ROMs  peak RSS {peak:>8}  {elapsed:8.1f}s")
+    return 0
+
+
+def tree_contents(root: Path) -> Dict[str, bytes]:
+    return {
+        p.relative_to(root).as_posix(): p.read_bytes()
+        for p in root.rglob("*")
+        if p.is_file()
+    }
+
+
+def bench_writes(n: int, workdir: Path, threads: int, fsync: bool) -> int:
+    """
+    Write n launchers (every 50th name twice, to exercise collision
+    suffixes) with 1 and `threads` threads; exits non-zero if the trees
+    differ.
+    """
+    print(f"[BENCH] {n:,} launchers in {workdir}  fsync={fsync}")
+    trees = []
+    for t in sorted({1, threads}):
+        root = workdir / f"threads{t}"
+        writer = LauncherWriter("skip-identical", t, fsync)
+        start = time.perf_counter()
+        for i in range(n):
+            folder = root / f"_Publisher {i % 40}" / f"_{1980 + i % 25}"
+            name = f"Game {i - i % 50 if i % 50 == 1 else i} (USA)"
+            writer.write(folder, name, f"<mistergamedescription>{i}\n")
+        writer.close()
+        elapsed = time.perf_counter() - start
+        print(f"  threads={t:<3} {elapsed:8.3f}s  {n / elapsed:10,.0f} launchers/s")
+        trees.append(tree_contents(root))
+    same = all(tree == trees[0] for tree in trees)
+    print(f"  trees identical: {same}")
+    return 0 if same else 1
+
+
+class FakeClock:
+    """Simulated time for the throttle: sleep() advances it instantly."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def check_throttle() -> int:
+    """
+    Replay reads and writes through IoThrottle on a FakeClock and compare
+    the simulated duration with what the limits allow. Exits non-zero on
+    a mismatch.
+    """
+    failures = 0
+
+    def expect(name: str, got: float, want: float) -> None:
+        nonlocal failures
+        ok = abs(got - want) <= 1e-6 * max(1.0, want)
+        failures += not ok
+        print(f"  {'ok ' if ok else 'BAD'} {name:<38} {got:10.4f}s  want {want:.4f}s")
+
+    print("[BENCH] throttle (simulated clock)")
+    # 100 MB in 1 MiB reads at 10 MB/s: the first BURST_SECONDS are free.
+    clock = FakeClock()
+    t = IoThrottle(max_read_mbps=10, clock=clock, sleep=clock.sleep)
+    total = 100 * 1_000_000
+    chunk = 1024 * 1024
+    left = total
+    while left:
+        n = min(chunk, left)
+        t.read(n)
+        left -= n
+    expect("100 MB at 10 MB/s", clock.now, total / 10e6 - BURST_SECONDS)
+
+    # 1000 launcher writes at 200 ops/s.
+    clock = FakeClock()
+    t = IoThrottle(max_iops=200, clock=clock, sleep=clock.sleep)
+    for _ in range(1000):
+        t.op()
+    expect("1000 writes at 200 IOPS", clock.now, 1000 / 200 - BURST_SECONDS)
+
+    # Many small reads: the IOPS limit dominates the bandwidth limit.
+    clock = FakeClock()
+    t = IoThrottle(max_read_mbps=100, max_iops=50, clock=clock, sleep=clock.sleep)
+    for _ in range(500):
+        t.read(4096)
+    expect("500 x 4 KiB reads at 50 IOPS", clock.now, 500 / 50 - BURST_SECONDS)
+
+    # Idle time refills at most BURST_SECONDS worth of tokens.
+    clock = FakeClock()
+    t = IoThrottle(max_read_mbps=1, clock=clock, sleep=clock.sleep)
+    t.read(1_000_000)
+    clock.now += 60
+    start = clock.now
+    t.read(1_000_000)
+    expect("1 MB after 60 s idle at 1 MB/s", clock.now - start, 1 - BURST_SECONDS)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        prog="MeGaLoSorTer.bench",
+        description="Benchmark cache backends or --low-memory runs on synthetic data.",
+    )
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("--backend", nargs="+", choices=list(BACKENDS), default=BACKENDS)
+    ap.add_argument(
+        "--dir",
+        type=Path,
+        default=None,
+        help="Where to create the cache files (default: a temp dir). Point it at "
+        "the SD card or NFS mount you want to measure.",
+    )
+    ap.add_argument(
+        "--rom-set",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Instead of the cache benchmark, generate N ROMs and report the peak "
+        "RSS of a --low-memory run over them",
+    )
+    ap.add_argument(
+        "--stress",
+        type=int,
+        nargs="+",
+        default=None,
+        metavar="N",
+        help="Instead of the cache benchmark, report the peak RSS of normal runs "
+        "over generated sets of each size N (e.g. 10000 100000 1000000)",
+    )
+    ap.add_argument(
+        "--throttle",
+        action="store_true",
+        help="Instead of the cache benchmark, check the I/O throttle schedule "
+        "against a simulated clock",
+    )
+    ap.add_argument(
+        "--writes",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Instead of the cache benchmark, time writing N launchers with "
+        "1 and --write-threads threads",
+    )
+    ap.add_argument("--write-threads", type=int, default=8, metavar="N")
+    ap.add_argument(
+        "--fsync", action="store_true", help="With --writes: as the CLI's --fsync"
+    )
+    args = ap.parse_args()
+
+    if args.throttle:
+        return check_throttle()
+    if args.writes:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            return bench_writes(args.writes, Path(tmp), args.write_threads, args.fsync)
+    if args.stress:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            return bench_stress(args.stress, Path(tmp))
+    if args.rom_set:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            return bench_rom_set(args.rom_set, Path(tmp))
+
+    rows = synthetic_rows(args.rows)
+    phases = ["open", "put", "close", "reopen", "get", "find_inode"]
+    print(f"[BENCH] rows={args.rows:,}")
+    print(f"  {'backend':<8}" + "".join(f"{p:>12}" for p in phases))
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for kind in args.backend:
+            t = bench_backend(kind, rows, Path(tmp))
+            print(f"  {kind:<8}" + "".join(f"{t[p]:>11.3f}s" for p in phases))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+
+@dataclass(frozen=True)
+class CacheRow:
+    path: str
+    size: int
+    mtime: float
+    sha1: str
+    dev: Optional[int] = None
+    ino: Optional[int] = None
+    sha1_nh: Optional[str] = None  # "" = no header found, None = never checked
+    fp: Optional[str] = None
+
+
+class CacheBackend:
+    """
+    Storage behind HashCache. Backends only store and look up rows;
+    validation (size/mtime, fingerprints, hardlinks) stays in HashCache.
+    """
+
+    def get(self, path: str) -> Optional[CacheRow]:
+        raise NotImplementedError
+
+    def put(self, row: CacheRow) -> None:
+        raise NotImplementedError
+
+    def put_many(self, rows: Iterable[CacheRow]) -> None:
+        for row in rows:
+            self.put(row)
+
+    def find_inode(
+        self, dev: int, ino: int, size: int, mtime: float, headerless: bool
+    ) -> Optional[CacheRow]:
+        """A row for the same physical file; with `headerless`, one that has sha1_nh."""
+        raise NotImplementedError
+
+    def delete(self, path: str) -> None:
+        raise NotImplementedError
+
+    def rows(self) -> Iterator[CacheRow]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBackend(CacheBackend):
+    """The classic hashcache.sqlite store, one committed row per file."""
+
+    COLUMNS = {
+        "dev": "INTEGER",
+        "ino": "INTEGER",
+        "sha1_nh": "TEXT",
+        "fp": "TEXT",
+    }
+    FIELDS = "path, size, mtime, sha1, dev, ino, sha1_nh, fp"
+
+    def __init__(self, db_path: Path, readonly: bool = False):
+        self.select = self.FIELDS
+        if readonly:
+            # Never migrated: columns an older version lacked read as NULL.
+            uri = f"{db_path.resolve().as_uri()}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True)
+            have = {r[1] for r in self.conn.execute("PRAGMA table_info(filehash)")}
+            self.select = ", ".join(
+                c if c in have else f"NULL AS {c}" for c in self.FIELDS.split(", ")
+            )
+            return
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS filehash(
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha1 TEXT NOT NULL
+            )
+        """)
+        self._migrate()
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS filehash_inode ON filehash(dev, ino)"
+        )
+        self.conn.commit()
+
+    def _migrate(self) -> None:
+        """Add columns missing from caches created by older versions."""
+        have = {r[1] for r in self.conn.execute("PRAGMA table_info(filehash)")}
+        for name, decl in self.COLUMNS.items():
+            if name not in have:
+                self.conn.execute(f"ALTER TABLE filehash ADD COLUMN {name} {decl}")
+
+    def get(self, path: str) -> Optional[CacheRow]:
+        row = self.conn.execute(
+            f"SELECT {self.select} FROM filehash WHERE path=?", (path,)
+        ).fetchone()
+        return CacheRow(*row) if row else None
+
+    def put(self, row: CacheRow) -> None:
+        self.put_many([row])
+
+    def put_many(self, rows: Iterable[CacheRow]) -> None:
+        """Insert or replace rows in one transaction."""
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO filehash({self.FIELDS}) VALUES (?,?,?,?,?,?,?,?)",
+            (
+                (
+                    row.path,
+                    row.size,
+                    row.mtime,
+                    row.sha1,
+                    row.dev,
+                    row.ino,
+                    row.sha1_nh,
+                    row.fp,
+                )
+                for row in rows
+            ),
+        )
+        self.conn.commit()
+
+    def find_inode(
+        self, dev: int, ino: int, size: int, mtime: float, headerless: bool
+    ) -> Optional[CacheRow]:
+        sql = (
+            f"SELECT {self.select} FROM filehash "
+            "WHERE dev=? AND ino=? AND size=? AND mtime=?"
+        )
+        if headerless:
+            sql += " AND sha1_nh IS NOT NULL"
+        row = self.conn.execute(sql + " LIMIT 1", (dev, ino, size, mtime)).fetchone()
+        return CacheRow(*row) if row else None
+
+    def delete(self, path: str) -> None:
+        self.conn.execute("DELETE FROM filehash WHERE path=?", (path,))
+        self.conn.commit()
+
+    def rows(self) -> Iterator[CacheRow]:
+        for row in self.conn.execute(f"SELECT {self.select} FROM filehash"):
+            yield CacheRow(*row)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class MemoryBackend(CacheBackend):
+    """Dict-backed store for one-shot runs; nothing is persisted."""
+
+    def __init__(self) -> None:
+        self.by_path: Dict[str, CacheRow] = {}
+        self.by_inode: Dict[Tuple[int, int], Set[str]] = {}
+
+    def get(self, path: str) -> Optional[CacheRow]:
+        return self.by_path.get(path)
+
+    def put(self, row: CacheRow) -> None:
+        old = self.by_path.get(row.path)
+        if old is not None and old.ino:
+            self.by_inode.get((old.dev, old.ino), set()).discard(row.path)
+        self.by_path[row.path] = row
+        if row.ino:
+            self.by_inode.setdefault((row.dev, row.ino), set()).add(row.path)
+
+    def find_inode(
+        self, dev: int, ino: int, size: int, mtime: float, headerless: bool
+    ) -> Optional[CacheRow]:
+        for path in self.by_inode.get((dev, ino), ()):
+            row = self.by_path[path]
+            if row.size == size and row.mtime == mtime:
+                if not headerless or row.sha1_nh is not None:
+                    return row
+        return None
+
+    def delete(self, path: str) -> None:
+        old = self.by_path.pop(path, None)
+        if old is not None and old.ino:
+            self.by_inode.get((old.dev, old.ino), set()).discard(path)
+
+    def rows(self) -> Iterator[CacheRow]:
+        return iter(list(self.by_path.values()))
+
+
+class LogBackend(MemoryBackend):
+    """
+    Append-only binary log. Loaded with one sequential read into memory,
+    new rows are appended as they are produced, and the log is rewritten
+    with only the latest row per path on close().
+
+    Suited to media where SQLite locking/journaling is slow or unreliable
+    (the MiSTer SD card, some NFS mounts). A record torn by a crash is
+    dropped on the next load, and a log cut off within its header (killed
+    right after creation) loads as empty.
+    """
+
+    MAGIC = b"MGLSHC1\n"
+    # path length, size, mtime, dev, ino, flags, sha1, sha1_nh, fp
+    REC = struct.Struct("<HqdqqB20s20s20s")
+    NH_KNOWN, NH_PRESENT, FP_PRESENT = 1, 2, 4
+    FLUSH_EVERY = 256
+
+    def __init__(self, log_path: Path, readonly: bool = False):
+        super().__init__()
+        self.path = log_path
+        self.f: Optional[BinaryIO] = None
+        if readonly:
+            # Loaded only: no truncation, no appends, no compaction on close.
+            self._load(log_path.read_bytes())
+            return
+        if log_path.exists():
+            data = log_path.read_bytes()
+            end = self._load(data)
+            if end < len(data):
+                # Cut the torn tail off, or new records would follow it.
+                with log_path.open("r+b") as f:
+                    f.truncate(end)
+        self.f = log_path.open("ab")
+        if self.f.tell() == 0:
+            # On disk at once: a log without its header is not recognised.
+            self.f.write(self.MAGIC)
+            self.f.flush()
+            os.fsync(self.f.fileno())
+        self.unflushed = 0
+        self.dirty = False  # anything put or deleted since loading
+
+    def _load(self, data: bytes) -> int:
+        """Load the records of `data`; returns the end of the last whole one."""
+        if self.MAGIC.startswith(data):
+            return 0  # empty, or the header itself was torn
+        if not data.startswith(self.MAGIC):
+            raise SystemExit(f"[ERR] Not a hash cache log: {self.path}")
+        pos, end = len(self.MAGIC), len(data)
+        while pos + self.REC.size <= end:
+            path_len, size, mtime, dev, ino, flags, sha1, nh, fp = (
+                self.REC.unpack_from(data, pos)
+            )
+            start = pos + self.REC.size
+            if start + path_len > end:
+                break
+            try:
+                path = data[start : start + path_len].decode("utf-8")
+            except UnicodeDecodeError:
+                break
+            sha1_nh = None
+            if flags & self.NH_KNOWN:
+                sha1_nh = nh.hex() if flags & self.NH_PRESENT else ""
+            super().put(
+                CacheRow(
+                    path=path,
+                    size=size,
+                    mtime=mtime,
+                    sha1=sha1.hex(),
+                    dev=dev,
+                    ino=ino,
+                    sha1_nh=sha1_nh,
+                    fp=fp.hex() if flags & self.FP_PRESENT else None,
+                )
+            )
+            pos = start + path_len
+        return pos
+
+    def _encode(self, row: CacheRow) -> bytes:
+        path = row.path.encode("utf-8")
+        flags = 0
+        if row.sha1_nh is not None:
+            flags |= self.NH_KNOWN | (self.NH_PRESENT if row.sha1_nh else 0)
+        if row.fp is not None:
+            flags |= self.FP_PRESENT
+        return (
+            self.REC.pack(
+                len(path),
+                row.size,
+                row.mtime,
+                row.dev or 0,
+                row.ino or 0,
+                flags,
+                bytes.fromhex(row.sha1),
+                bytes.fromhex(row.sha1_nh) if row.sha1_nh else bytes(20),
+                bytes.fromhex(row.fp) if row.fp else bytes(20),
+            )
+            + path
+        )
+
+    def put(self, row: CacheRow) -> None:
+        if self.f is None:
+            raise ValueError(f"Hash cache log opened read-only: {self.path}")
+        super().put(row)
+        self.dirty = True
+        self.f.write(self._encode(row))
+        self.unflushed += 1
+        if self.unflushed >= self.FLUSH_EVERY:
+            self.f.flush()
+            self.unflushed = 0
+
+    def delete(self, path: str) -> None:
+        super().delete(path)
+        self.dirty = True  # dropped from the file by the compaction on close()
+
+    def close(self) -> None:
+        if self.f is None:
+            return
+        self.f.close()
+        if not self.dirty:
+            return  # nothing to compact away
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("wb") as f:
+            f.write(self.MAGIC)
+            for row in self.by_path.values():
+                f.write(self._encode(row))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+BACKENDS = ("sqlite", "memory", "log")
+
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+def detect_backend(path: Path) -> str:
+    """Backend kind of an existing cache file, from its first bytes."""
+    with path.open("rb") as f:
+        head = f.read(len(SQLITE_MAGIC))
+    if head.startswith(SQLITE_MAGIC):
+        return "sqlite"
+    if LogBackend.MAGIC.startswith(head) or head.startswith(LogBackend.MAGIC):
+        return "log"  # an empty or header-torn log loads as empty
+    raise SystemExit(f"[ERR] Not a hash cache: {path}")
+
+
+def open_backend(kind: str, path: Path, readonly: bool = False) -> CacheBackend:
+    """
+    With `readonly` an existing cache file is only read: never created,
+    migrated, truncated or compacted, so it may be a read-only copy.
+    """
+    if kind == "sqlite":
+        return SqliteBackend(path, readonly)
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "log":
+        return LogBackend(path, readonly)
+    raise ValueError(f"Unknown cache backend: {kind}")
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """
+    One scanned ROM, as recorded by a full run.
+    Enough to rebuild its launchers without touching the ROM storage.
+    """
+
+    path: str  # ROM path relative to romdir, posix separators
+    sha1: Optional[str]  # None when matched by filename or size-filtered
+    slot: int  # index into SystemConfig.slots
+    key: Optional[str]  # SHA1 key of the matched GameMeta, None if unmatched
+
+
+class CatalogWriter:
+    """
+    Writes a JSONL catalog to a temporary file and moves it into place on
+    commit(), so an interrupted run never leaves a truncated catalog behind.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp = path.with_name(path.name + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.f = self.tmp.open("w", encoding="utf-8", newline="\n")
+
+    def add(self, entry: CatalogEntry) -> None:
+        self.f.write(json.dumps(asdict(entry), separators=(",", ":")) + "\n")
+
+    def commit(self) -> None:
+        self.f.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self) -> None:
+        self.f.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+def read_catalog(path: Path) -> Iterator[CatalogEntry]:
+    if not path.exists():
+        raise SystemExit(
+            f"[ERR] Catalog not found: {path} (run once without --refacet first)"
+        )
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield CatalogEntry(**json.loads(line))
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    """A ROM finished by a run: its catalog entry and how it was matched."""
+
+    entry: CatalogEntry
+    matched_by: Optional[str]
+    size_filtered: bool
+
+
+class RunJournal:
+    """
+    Progress of the current run for --resume: the ROMs it has finished, in
+    processing order, as JSON lines after a header line holding the run's
+    input digest. Entries are appended one batch at a time, once that
+    batch's launchers are on disk, and the file is removed when the run
+    completes.
+
+    A resumed run walks the tree in the same order, so the journal of an
+    interrupted run is a prefix of it: match() is asked about each ROM in
+    turn and answers from the journal until the first ROM that differs.
+    The journal is cut there and the run's new entries are appended, so it
+    stays a prefix for the next resume. Memory use does not depend on its
+    length.
+    """
+
+    def __init__(self, path: Path, inputs: str, resume: bool):
+        self.path = path
+        self.pending: List[str] = []
+        self.resumed = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = (json.dumps({"inputs": inputs}) + "\n").encode("utf-8")
+
+        self.reader: Optional[BinaryIO] = None
+        if resume:
+            try:
+                self.reader = path.open("rb")
+            except OSError:
+                pass
+            if self.reader is not None and self.reader.readline() != header:
+                print(f"[RESUME] {path} is from other inputs; starting over")
+                self.reader.close()
+                self.reader = None
+        if self.reader is None:
+            self.f = path.open("wb")
+            self.f.write(header)
+            self.f.flush()
+        else:
+            self.f = path.open("r+b")
+        # End of the entries known to be valid; new ones are written here.
+        self.end = len(header)
+
+    @property
+    def resuming(self) -> bool:
+        return self.reader is not None
+
+    def match(self, rel_path: str) -> Optional[JournalEntry]:
+        """The journaled result for the next ROM, if that ROM is `rel_path`."""
+        if self.reader is None:
+            return None
+        line = self.reader.readline()
+        try:
+            d = json.loads(line) if line.endswith(b"\n") else None
+        except ValueError:
+            d = None
+        if d is None or d.get("path") != rel_path:
+            # End of the journal, a line torn by the interruption, or a
+            # tree that changed since: from here on, everything is new.
+            self.reader.close()
+            self.reader = None
+            return None
+        self.end += len(line)
+        self.resumed += 1
+        by = d.pop("by", None)
+        filtered = bool(d.pop("filtered", False))
+        return JournalEntry(CatalogEntry(**d), by, filtered)
+
+    def add(self, done: JournalEntry) -> None:
+        d = asdict(done.entry)
+        d["by"] = done.matched_by
+        d["filtered"] = done.size_filtered
+        self.pending.append(json.dumps(d, separators=(",", ":")) + "\n")
+
+    def flush(self) -> None:
+        """Append the pending entries; call once their launchers are written."""
+        if not self.pending:
+            return
+        data = "".join(self.pending).encode("utf-8")
+        self.f.seek(self.end)
+        self.f.write(data)
+        self.f.truncate()
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.end += len(data)
+        self.pending = []
+
+    def close(self, completed: bool) -> None:
+        """Without `completed`, the journal is kept (pending entries dropped)."""
+        if self.reader is not None:
+            self.reader.close()
+        self.f.close()
+        if completed:
+            self.path.unlink(missing_ok=True)
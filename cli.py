@@ -1,11 +1,26 @@
 from __future__ import annotations
 
 import argparse
+from dataclasses import replace
 from pathlib import Path
-from .profiles import FileEntry, PROFILES, Slot
+from typing import List, Optional
 
+from .profiles import PROFILES, ProfileRegistry, Slot, load_profiles, normalize_ext
+
+from .cachestore import BACKENDS
 from .config import SystemConfig
-from .organizer import run_system
+from .distributed import hash_shard, merge_from_args, parse_shard
+from .facets import FACETS
+from .organizer import refacet_system, run_system
+from .report import report_from_args
+from .scan import read_file_list
+from .server import serve
+from .throttle import lower_io_priority
+
+
+# Peak-RSS target for --low-memory: a quarter of the DE10-Nano's 1 GB, leaving
+# room for Linux, the MiSTer main binary and the page cache.
+LOW_MEMORY_RSS_MB = 256
 
 
 def default_csv(root: Path) -> Path:
@@ -28,7 +43,27 @@ def default_csv(root: Path) -> Path:
     )  # conventional may not exist, but it's a sensible default
 
 
-def build_argparser() -> argparse.ArgumentParser:
+def add_profiles_dir(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument(
+        "--profiles-dir",
+        type=Path,
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="Also load system profiles from DIR/*.json (repeatable); a profile "
+        "with a built-in name replaces it. Same format as profiles.json",
+    )
+
+
+def load_registry(argv: Optional[List[str]] = None) -> ProfileRegistry:
+    """The profiles --system may name: built-ins plus any --profiles-dir."""
+    pre = argparse.ArgumentParser(add_help=False)
+    add_profiles_dir(pre)
+    dirs = pre.parse_known_args(argv)[0].profiles_dir
+    return load_profiles(dirs) if dirs else PROFILES
+
+
+def build_argparser(profiles: ProfileRegistry = PROFILES) -> argparse.ArgumentParser:
     root = Path.cwd()
 
     ap = argparse.ArgumentParser(
@@ -39,8 +74,12 @@ def build_argparser() -> argparse.ArgumentParser:
     ap.add_argument(
         "--csv",
         type=Path,
-        default=default_csv(root),
-        help="Path to the PigSaint CSV. Defaults to a CSV in the current directory.",
+        nargs="+",
+        action="extend",
+        default=None,
+        help="Path to the PigSaint CSV. Defaults to a CSV in the current directory. "
+        "Several CSVs are merged into one index under outdir; for a SHA1 found in "
+        "more than one, the first CSV listed wins",
     )
     ap.add_argument(
         "--romdir",
@@ -48,6 +87,14 @@ def build_argparser() -> argparse.ArgumentParser:
         default=root / "ROMS",
         help="Folder containing ROMs. Defaults to ./ROMS",
     )
+    ap.add_argument(
+        "--files-from",
+        default=None,
+        metavar="FILE|-",
+        help="Process only the ROMs listed in FILE (or stdin) instead of walking "
+        "--romdir: one path per line or NUL-separated, optionally as "
+        "SIZE<TAB>MTIME<TAB>PATH",
+    )
     ap.add_argument(
         "--outdir",
         type=Path,
@@ -57,10 +104,11 @@ def build_argparser() -> argparse.ArgumentParser:
 
     ap.add_argument(
         "--system",
-        choices=sorted(PROFILES.keys()),
+        choices=sorted(profiles.keys()),
         default="genesis",
         help="System profile to use (sets rbf/setname/file args/ext defaults).",
     )
+    add_profiles_dir(ap)
 
     ap.add_argument(
         "--rbf",
@@ -88,7 +136,15 @@ def build_argparser() -> argparse.ArgumentParser:
         "--facets",
         nargs="+",
         default=["publisher", "developer", "genre"],
-        choices=["publisher", "developer", "genre", "year", "date"],
+        choices=list(FACETS),
+    )
+    ap.add_argument(
+        "--views",
+        nargs="+",
+        default=[],
+        metavar="FACET/FACET",
+        help="Combined views, e.g. genre/year publisher/year -> "
+        "_Genre/<g>/_Year/<y>",
     )
     ap.add_argument("--genre-depth", type=int, default=2, choices=[1, 2])
     ap.add_argument("--date-depth", type=int, default=2, choices=[1, 2, 3])
@@ -99,63 +155,214 @@ def build_argparser() -> argparse.ArgumentParser:
         default="rom",
         help="rom = use ROM filename for .mgl name; db = use DB title/region/id",
     )
+    ap.add_argument(
+        "--match-mode",
+        choices=["hash", "filename"],
+        default="hash",
+        help="hash = match by SHA1; filename = trust 'Title (Region)' ROM names "
+        "and hash only ambiguous/unknown files",
+    )
+    ap.add_argument(
+        "--dat",
+        nargs="+",
+        type=Path,
+        default=[],
+        help="No-Intro/Redump DAT XML file(s); ROMs whose size matches no DAT "
+        "entry are treated as unmatched without being hashed",
+    )
     ap.add_argument(
         "--on-collision",
         choices=["suffix", "skip-identical"],
         default="skip-identical",
         help="suffix = write __2 etc; skip-identical = skip if same content else suffix",
     )
+    ap.add_argument(
+        "--write-threads",
+        type=int,
+        default=8,
+        metavar="N",
+        help="Threads writing launchers (default 8; 1 writes them one at a time). "
+        "Names and collision suffixes do not depend on it",
+    )
+    ap.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Make launchers durable before the run ends: each file is synced "
+        "before it is renamed into place, each folder once at the end",
+    )
 
     ap.add_argument(
         "--write-unmatched",
         action="store_true",
         help="Also write launchers for ROMs not found in the CSV under _Unmatched/",
     )
+    ap.add_argument(
+        "--max-per-folder",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Split any menu folder with more than N launchers into _A.._Z/_0-9 "
+        "(or _Aa-Ba style range) subfolders. 0 = no limit",
+    )
+    ap.add_argument(
+        "--low-memory",
+        action="store_true",
+        help="Stream the walk, hashing and output, look up the CSV through an "
+        "on-disk index and use small hash buffers (for running on the MiSTer)",
+    )
+    ap.add_argument(
+        "--max-rss-mb",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="Abort if peak RSS exceeds MB. Defaults to "
+        f"{LOW_MEMORY_RSS_MB} with --low-memory, unchecked otherwise",
+    )
+    ap.add_argument(
+        "--max-read-mbps",
+        type=float,
+        default=0,
+        metavar="MB/S",
+        help="Limit ROM reads to this many MB (10^6 bytes) per second. 0 = no limit",
+    )
+    ap.add_argument(
+        "--max-iops",
+        type=float,
+        default=0,
+        metavar="N",
+        help="Limit file reads plus launcher writes to N per second. 0 = no limit",
+    )
+    ap.add_argument(
+        "--io-idle",
+        action="store_true",
+        help="Run at idle I/O priority (like ionice -c3) and lowest CPU priority",
+    )
     ap.add_argument(
         "--dry-run",
         action="store_true",
         help="Compute matches and stats, but don’t write .mgl files",
     )
 
+    ap.add_argument(
+        "--force",
+        action="store_true",
+        help="Run even if config, CSV, tool version and ROM tree are unchanged "
+        "since the last run",
+    )
+    ap.add_argument(
+        "--rescan",
+        action="store_true",
+        help="List every romdir directory again instead of reusing listings of "
+        "directories whose mtime is unchanged (implies --force)",
+    )
+    ap.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run: ROMs its journal records as done are "
+        "neither looked up nor written again. Without it, a run starts over",
+    )
+    ap.add_argument(
+        "--refacet",
+        action="store_true",
+        help="Rebuild the .mgl tree from the catalog of the last run and the CSV "
+        "(honours --facets/--date-depth/--genre-depth/--name-source) without "
+        "reading romdir",
+    )
+    ap.add_argument(
+        "--prune",
+        action="store_true",
+        help="With --refacet: delete launchers the new layout no longer has "
+        "(other facets, old names), leaving the tree as a clean run would",
+    )
+
+    ap.add_argument(
+        "--shard",
+        default=None,
+        metavar="I/N",
+        help="Only hash shard I of N (1-based, split by path relative to romdir) "
+        "into --cache; no matching or output. Combine shards with --merge-cache",
+    )
+    ap.add_argument(
+        "--merge-cache",
+        nargs="+",
+        type=Path,
+        default=[],
+        metavar="PART",
+        help="Merge partial hash caches (e.g. from --shard runs) into --cache",
+    )
+    ap.add_argument(
+        "--rewrite-prefix",
+        action="append",
+        default=[],
+        metavar="OLD=NEW",
+        help="With --merge-cache: replace path prefix OLD by NEW (repeatable), "
+        "for shards that mounted the ROM storage elsewhere",
+    )
+    ap.add_argument(
+        "--report",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Write a duplicate / misplaced / coverage report from --cache and the "
+        "CSVs (JSON, or three CSV tables if FILE ends in .csv); no ROM is read",
+    )
+    ap.add_argument(
+        "--report-system",
+        nargs=3,
+        action="append",
+        default=[],
+        metavar=("SYSTEM", "CSV", "ROMDIR"),
+        help="With --report: a system to cover (repeatable). Default: --system "
+        "with --csv and --romdir",
+    )
+    ap.add_argument(
+        "--serve",
+        type=Path,
+        default=None,
+        metavar="SOCKET",
+        help="Keep CSV indexes and the hash cache loaded and answer JSON-RPC "
+        "requests on this Unix socket (see MeGaLoSorTer.client)",
+    )
+
     ap.add_argument(
         "--cache",
         type=Path,
-        default=Path.cwd() / "hashcache.sqlite",
-        help="SQLite cache path (default: ./hashcache.sqlite)",
+        default=None,
+        help="Hash cache path (default: ./hashcache.sqlite, or ./hashcache.log "
+        "with --cache-backend log)",
+    )
+    ap.add_argument(
+        "--cache-backend",
+        choices=list(BACKENDS),
+        default="sqlite",
+        help="sqlite = SQLite database; memory = no persistence (one-shot runs); "
+        "log = append-only binary log, compacted on exit",
+    )
+    ap.add_argument(
+        "--strict-cache",
+        action="store_true",
+        help="Rehash any file whose mtime changed, instead of revalidating the "
+        "cached SHA1 with a size + first/middle/last 64 KiB fingerprint",
     )
 
     return ap
 
 
-def main() -> int:
-    args = build_argparser().parse_args()
+def config_from_args(
+    args: argparse.Namespace,
+    system: str = "",
+    profiles: ProfileRegistry = PROFILES,
+) -> SystemConfig:
+    """SystemConfig for `system` (default: --system) from parsed options."""
+    system = system or args.system
+    if system not in profiles:
+        raise SystemExit(f"[ERR] Unknown system profile: {system}")
 
     # If user didn't override outdir, make it follow setname automatically:
     # ./_Organized/_<setname>
     root = Path.cwd()
-    profile = PROFILES[args.system]
-
-    def normalize_ext(ext: str) -> str:
-        e = (ext or "").strip().lower()
-        return e if e.startswith(".") else f".{e}"
-
-    if profile.slots:
-        slots = tuple(
-            Slot(exts=tuple(normalize_ext(e) for e in s.exts), files=s.files)
-            for s in profile.slots
-        )
-    else:
-        default_slot = Slot(
-            exts=tuple(normalize_ext(e) for e in profile.exts),
-            files=(
-                FileEntry(
-                    delay=profile.file_delay,
-                    file_type=profile.file_type,
-                    index=profile.file_index,
-                ),
-            ),
-        )
-        slots = (default_slot,)
+    profile = profiles[system]
+    slots = profile.effective_slots()
 
     rbf = args.rbf or profile.rbf
     setname = args.setname or profile.setname
@@ -167,35 +374,123 @@ def main() -> int:
         for slot in slots:
             slot_exts = tuple(e for e in slot.exts if e in desired)
             if slot_exts:
-                filtered.append(Slot(exts=slot_exts, files=slot.files))
+                filtered.append(replace(slot, exts=slot_exts))
         slots = tuple(filtered)
         if not slots:
             raise SystemExit(
                 "[ERR] --ext did not match any extensions in the selected profile."
             )
 
+    for view in args.views:
+        parts = view.lower().split("/")
+        if len(parts) < 2 or any(p not in FACETS for p in parts):
+            raise SystemExit(
+                f"[ERR] --views {view!r}: expected facets joined by '/', "
+                f"from {', '.join(FACETS)}"
+            )
+
+    if args.max_per_folder < 0:
+        raise SystemExit("[ERR] --max-per-folder must be 0 (no limit) or positive.")
+    if args.resume and (args.max_per_folder or args.files_from):
+        raise SystemExit(
+            "[ERR] --resume continues full runs; it cannot be combined with "
+            "--max-per-folder or --files-from."
+        )
+    if args.low_memory and args.max_per_folder:
+        raise SystemExit(
+            "[ERR] --max-per-folder needs the whole tree in memory; "
+            "it cannot be combined with --low-memory."
+        )
+    if args.prune and not args.refacet:
+        raise SystemExit("[ERR] --prune only applies to --refacet.")
+    if args.cache_backend == "memory" and (args.shard or args.merge_cache):
+        raise SystemExit(
+            "[ERR] --shard and --merge-cache write a cache file; "
+            "use --cache-backend sqlite or log."
+        )
+    if args.write_threads < 1:
+        raise SystemExit("[ERR] --write-threads must be at least 1.")
+    if args.max_read_mbps < 0 or args.max_iops < 0:
+        raise SystemExit(
+            "[ERR] --max-read-mbps and --max-iops must be 0 (no limit) or positive."
+        )
+    max_rss_mb = args.max_rss_mb
+    if max_rss_mb is None:
+        max_rss_mb = LOW_MEMORY_RSS_MB if args.low_memory else 0
+
+    csvs = args.csv or [default_csv(root)]
     outdir = args.outdir or (root / "_Organized" / f"_{setname}")
+    cache = args.cache or root / (
+        "hashcache.log" if args.cache_backend == "log" else "hashcache.sqlite"
+    )
 
-    cfg = SystemConfig(
+    return SystemConfig(
         name=setname,
-        csv_path=args.csv,
+        csv_path=csvs[0],
+        more_csv_paths=list(csvs[1:]),
         romdir=args.romdir,
         outdir=outdir,
-        cache_path=args.cache,
+        cache_path=cache,
+        cache_backend=args.cache_backend,
+        strict_cache=args.strict_cache,
         rbf=rbf,
         setname=setname,
         prefix_in_core=prefix,
         slots=list(slots),
         facets=list(args.facets),
+        views=[v.lower() for v in args.views],
         genre_depth=args.genre_depth,
         date_depth=args.date_depth,
         name_source=args.name_source,
+        match_mode=args.match_mode,
+        dat_paths=list(args.dat),
         on_collision=args.on_collision,
         write_unmatched=args.write_unmatched,
+        max_per_folder=args.max_per_folder,
+        max_read_mbps=args.max_read_mbps,
+        max_iops=args.max_iops,
+        write_threads=args.write_threads,
+        fsync=args.fsync,
+        low_memory=args.low_memory,
+        max_rss_mb=max_rss_mb,
         dry_run=args.dry_run,
-        system=args.system,
+        force=args.force,
+        rescan=args.rescan,
+        resume=args.resume,
+        system=system,
     )
 
+
+def main() -> int:
+    profiles = load_registry()
+    args = build_argparser(profiles).parse_args()
+    if args.io_idle and not lower_io_priority():
+        print("[WARN] --io-idle: idle I/O class unavailable, only CPU priority lowered")
+    if args.serve:
+        return serve(
+            args.serve, lambda system: config_from_args(args, system, profiles)
+        )
+
+    cfg = config_from_args(args, profiles=profiles)
+    if args.merge_cache:
+        return merge_from_args(cfg, args.merge_cache, args.rewrite_prefix)
+    if args.shard:
+        return hash_shard(cfg, *parse_shard(args.shard))
+    if args.report:
+        systems = [
+            replace(
+                config_from_args(args, name, profiles),
+                csv_path=Path(csv),
+                more_csv_paths=[],
+                romdir=Path(romdir),
+            )
+            for name, csv, romdir in args.report_system
+        ]
+        return report_from_args(cfg, args.report, systems or [cfg])
+    if args.refacet:
+        return refacet_system(cfg, prune=args.prune)
+    if args.files_from:
+        return run_system(cfg, files=read_file_list(args.files_from))
     return run_system(cfg)
 
 
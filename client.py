@@ -0,0 +1,121 @@
+"""
+Client for the --serve socket, also usable from the command line:
+
+    python -m MeGaLoSorTer.client /tmp/mgl.sock match_path path=ROMS/Foo.md
+    python -m MeGaLoSorTer.client /tmp/mgl.sock match_hash sha1=... --repeat 1000
+
+Prints each result as JSON and, with --repeat, the per-request latency.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{message} (code {code})")
+        self.code = code
+
+
+class Client:
+    """One connection to a server; requests are answered in order."""
+
+    def __init__(self, socket_path: Path, timeout: Optional[float] = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(str(socket_path))
+        self.rfile = self.sock.makefile("rb")
+        self.next_id = 1
+
+    def call(self, method: str, **params: Any) -> Any:
+        request = {
+            "jsonrpc": "2.0",
+            "id": self.next_id,
+            "method": method,
+            "params": params,
+        }
+        self.next_id += 1
+        self.sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            err = response["error"]
+            raise RpcError(err["code"], err["message"])
+        return response["result"]
+
+    def close(self) -> None:
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def parse_params(pairs: List[str]) -> Dict[str, Any]:
+    """key=value pairs; values are JSON when they parse as JSON (true, 3...)."""
+    params: Dict[str, Any] = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"[ERR] expected key=value, got {pair!r}")
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        prog="MeGaLoSorTer.client",
+        description="Send one JSON-RPC request to a MeGaLoSorTer --serve socket.",
+    )
+    ap.add_argument("socket", type=Path)
+    ap.add_argument("method")
+    ap.add_argument("params", nargs="*", metavar="KEY=VALUE")
+    ap.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Send the request N times on one connection and report latency",
+    )
+    args = ap.parse_args()
+    params = parse_params(args.params)
+
+    timings = []
+    with Client(args.socket) as client:
+        for _ in range(max(1, args.repeat)):
+            t0 = time.perf_counter()
+            try:
+                result = client.call(args.method, **params)
+            except RpcError as e:
+                raise SystemExit(f"[ERR] {e}")
+            timings.append(time.perf_counter() - t0)
+
+    if isinstance(result, dict) and isinstance(result.get("output"), str):
+        print(result.pop("output"), end="")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.repeat > 1:
+        timings.sort()
+        print(
+            f"[CLIENT] {len(timings)} requests  "
+            f"median={timings[len(timings) // 2] * 1000:.2f} ms  "
+            f"max={timings[-1] * 1000:.2f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 from pathlib import Path
 from typing import List
 
-from .profiles import Slot
+from .profiles import Slot, SlotTable
 
 @dataclass(frozen=True)
 class SystemConfig:
@@ -24,6 +25,7 @@ class SystemConfig:
 
     slots: List[Slot]
     facets: List[str]  # e.g. ["publisher","developer","genre","date"]
+    views: List[str] = field(default_factory=list)  # e.g. ["genre/year"]
 
     genre_depth: int = 2  # 1 or 2
     date_depth: int = 2  # 1=Year, 2=Year/Month, 3=Year/Month/Day
@@ -31,6 +33,45 @@ class SystemConfig:
     system: str = ""
 
     name_source: str = "rom"  # "rom" | "db"
+    match_mode: str = "hash"  # "hash" | "filename"
+    cache_backend: str = "sqlite"  # "sqlite" | "memory" | "log"
+    strict_cache: bool = False  # never reuse a digest after an mtime change
+    dat_paths: List[Path] = field(default_factory=list)  # size pre-filter
+    # Further --csv sources, lower priority than csv_path and in that order.
+    more_csv_paths: List[Path] = field(default_factory=list)
     on_collision: str = "skip-identical"  # "suffix" | "skip-identical"
     write_unmatched: bool = False
+    low_memory: bool = False  # stream everything, on-disk DB index
+    max_rss_mb: int = 0  # abort if peak RSS exceeds this (0 = unchecked)
+    max_per_folder: int = 0  # 0 = unlimited; else shard bigger menu folders
+    max_read_mbps: float = 0  # read bandwidth limit, MB/s (0 = unlimited)
+    max_iops: float = 0  # reads + launcher writes per second (0 = unlimited)
+    write_threads: int = 8  # launcher writer threads (1 = write inline)
+    fsync: bool = False  # sync launchers and their folders before finishing
     dry_run: bool = False
+    force: bool = False  # ignore the no-op fingerprint of the previous run
+    rescan: bool = False  # list every directory, ignore cached listings
+    resume: bool = False  # skip ROMs finished by an interrupted run
+
+    @cached_property
+    def slot_table(self) -> SlotTable:
+        """Extension dispatch and launcher templates, compiled once."""
+        return SlotTable(self.slots, self.rbf, self.setname, self.prefix_in_core)
+
+    @property
+    def csv_paths(self) -> List[Path]:
+        """Every CSV source, highest priority first."""
+        return [self.csv_path, *self.more_csv_paths]
+
+    @property
+    def state_dir(self) -> Path:
+        """Run state kept next to the generated tree (catalog etc.)."""
+        return self.outdir / ".megalosorter"
+
+    @property
+    def catalog_path(self) -> Path:
+        return self.state_dir / "catalog.jsonl"
+
+    @property
+    def journal_path(self) -> Path:
+        return self.state_dir / "journal.jsonl"
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import csv
+import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterator, List, Mapping, Optional
 
 # Your CSV headers
 CSV_SHA1 = "SHA1"
@@ -30,6 +31,9 @@ class GameMeta:
     md5: str
 
 
+TitleIndex = Mapping[str, List[GameMeta]]
+
+
 def detect_csv_dialect(csv_path: Path) -> csv.Dialect:
     sample = csv_path.read_text(encoding="utf-8", errors="replace")[:50_000]
     try:
@@ -47,7 +51,8 @@ def detect_csv_dialect(csv_path: Path) -> csv.Dialect:
         return Comma()
 
 
-def load_db(csv_path: Path, verbose: bool = True) -> Dict[str, GameMeta]:
+def iter_db(csv_path: Path, verbose: bool = True) -> Iterator[GameMeta]:
+    """Stream the CSV rows that carry a SHA1, as GameMeta."""
     dialect = detect_csv_dialect(csv_path)
     if verbose:
         print(f"[CSV] delimiter={repr(dialect.delimiter)}  file={csv_path}")
@@ -65,12 +70,11 @@ def load_db(csv_path: Path, verbose: bool = True) -> Dict[str, GameMeta]:
         if missing:
             raise SystemExit(f"[CSV] Missing required headers: {missing}")
 
-        by_sha1: Dict[str, GameMeta] = {}
         for row in reader:
             sha1 = (row.get(CSV_SHA1) or "").strip().lower()
             if not sha1:
                 continue
-            meta = GameMeta(
+            yield GameMeta(
                 title=(row.get(CSV_TITLE) or "").strip(),
                 game_id=(row.get(CSV_ID) or "").strip(),
                 region=(row.get(CSV_REGION) or "").strip(),
@@ -81,8 +85,55 @@ def load_db(csv_path: Path, verbose: bool = True) -> Dict[str, GameMeta]:
                 sha1=sha1,
                 md5=(row.get(CSV_MD5) or "").strip().lower(),
             )
-            by_sha1.setdefault(sha1, meta)
+
+
+def load_db(csv_path: Path, verbose: bool = True) -> Dict[str, GameMeta]:
+    by_sha1: Dict[str, GameMeta] = {}
+    for meta in iter_db(csv_path, verbose=verbose):
+        by_sha1.setdefault(meta.sha1, meta)
 
     if verbose:
         print(f"[DB] entries indexed by SHA1: {len(by_sha1):,}")
     return by_sha1
+
+
+def title_key(text: str) -> str:
+    """Normalize a 'Title (Region)' string for case/whitespace-insensitive lookup."""
+    return " ".join((text or "").casefold().split())
+
+
+def meta_title_key(meta: GameMeta) -> str:
+    name = f"{meta.title} ({meta.region})" if meta.region else meta.title
+    return title_key(name)
+
+
+def build_title_index(db: Dict[str, GameMeta]) -> Dict[str, List[GameMeta]]:
+    """
+    Index DB entries by title + region, the way curated No-Intro filenames
+    are spelled: "Title (Region)". Entries without a region are indexed by
+    title alone. A key mapping to more than one entry is ambiguous.
+    """
+    index: Dict[str, List[GameMeta]] = {}
+    for meta in db.values():
+        if meta.title:
+            index.setdefault(meta_title_key(meta), []).append(meta)
+    return index
+
+
+def lookup_title(index: TitleIndex, stem: str) -> Optional[GameMeta]:
+    """
+    Resolve a ROM filename stem against a title index (a dict from
+    build_title_index, or anything with the same get()).
+    Trailing dump flags such as "[!]" are ignored. Returns None if the stem
+    is unknown or ambiguous, so the caller can fall back to hashing.
+    """
+    candidates = [stem]
+    stripped = re.sub(r"(\s*\[[^\]]*\])+\s*$", "", stem)
+    if stripped and stripped != stem:
+        candidates.append(stripped)
+
+    for name in candidates:
+        hits = index.get(title_key(name))
+        if hits:
+            return hits[0] if len(hits) == 1 else None
+    return None
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from pathlib import Path
+from typing import FrozenSet, Iterable
+
+
+@dataclass(frozen=True)
+class DatIndex:
+    """
+    ROM sizes known to one or more No-Intro/Redump DAT files.
+    A file whose size is not in `sizes` can never match and need not be hashed.
+    """
+
+    sizes: FrozenSet[int]
+    entries: int
+
+    def may_match(self, size: int) -> bool:
+        return size in self.sizes
+
+
+def load_dats(dat_paths: Iterable[Path], verbose: bool = True) -> DatIndex:
+    """
+    Collect the `size` attribute of every <rom> element in the given
+    Logiqx-style DAT XML files (the format used by No-Intro and Redump).
+    """
+    sizes: set[int] = set()
+    entries = 0
+    for dat_path in dat_paths:
+        if not dat_path.exists():
+            raise SystemExit(f"[ERR] DAT not found: {dat_path}")
+        try:
+            for _event, elem in ET.iterparse(str(dat_path), events=("end",)):
+                if elem.tag == "rom":
+                    size = (elem.get("size") or "").strip()
+                    if size.isdigit():
+                        sizes.add(int(size))
+                        entries += 1
+                elif elem.tag in ("game", "machine"):
+                    elem.clear()
+        except ET.ParseError as e:
+            raise SystemExit(f"[ERR] Could not parse DAT {dat_path}: {e}")
+        if verbose:
+            print(f"[DAT] file={dat_path}")
+
+    if verbose:
+        print(f"[DAT] rom entries={entries:,}  distinct sizes={len(sizes):,}")
+    return DatIndex(sizes=frozenset(sizes), entries=entries)
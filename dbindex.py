@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .csvdb import GameMeta, iter_db, meta_title_key
+
+FIELDS = (
+    "title",
+    "game_id",
+    "region",
+    "release_date",
+    "developer",
+    "publisher",
+    "tags",
+    "sha1",
+    "md5",
+)
+
+
+# Bumped whenever the tables below change; older index files are rebuilt.
+SCHEMA_VERSION = 2
+
+
+class DiskDb:
+    """
+    One or more CSVs indexed by SHA1 in an on-disk SQLite file. Lookups go
+    to disk instead of a dict holding every GameMeta (--low-memory), and
+    several sources are merged here once instead of on every run.
+
+    Each source's rows are kept apart in `entries`, tagged with the source.
+    `games` holds, per SHA1, the row of the first source in `csv_paths` that
+    has it; lookups only read `games`. A source is parsed again only when
+    its size or mtime changes, and `games` is merged again from `entries`
+    (no CSV parsing) when a source or the priority order changed.
+    """
+
+    def __init__(
+        self, csv_paths: Sequence[Path], index_path: Path, verbose: bool = True
+    ):
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(index_path))
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._create()
+
+        paths = list(dict.fromkeys(str(p.resolve()) for p in csv_paths))
+        known = {
+            path: (src, signature)
+            for src, path, signature in self.conn.execute(
+                "SELECT id, path, signature FROM sources"
+            )
+        }
+        changed = False
+        for path, (src, _) in known.items():
+            if path not in paths:
+                self.conn.execute("DELETE FROM entries WHERE src=?", (src,))
+                self.conn.execute("DELETE FROM sources WHERE id=?", (src,))
+                changed = True
+
+        order = []
+        for path in paths:
+            st = os.stat(path)
+            signature = f"{st.st_size}|{st.st_mtime}"
+            if path in known:
+                src, indexed = known[path]
+            else:
+                src = self.conn.execute(
+                    "INSERT INTO sources(path, signature, rows) VALUES (?, '', 0)",
+                    (path,),
+                ).lastrowid
+                indexed = ""
+            if indexed != signature:
+                self._index(src, Path(path), signature, verbose)
+                changed = True
+            elif verbose:
+                print(f"[DB] on-disk index up to date: {path}")
+            order.append(str(src))
+
+        row = self.conn.execute("SELECT v FROM meta WHERE k='order'").fetchone()
+        if changed or row is None or row[0] != ",".join(order):
+            self._merge([int(src) for src in order])
+        self.conn.commit()
+        if verbose:
+            if len(paths) > 1:
+                for path, rows, won in self.provenance():
+                    print(f"[DB] {path}: {rows:,} entries, {won:,} used")
+            print(f"[DB] entries indexed by SHA1: {len(self):,}")
+
+    def _create(self) -> None:
+        for table in ("source", "sources", "entries", "games", "meta"):
+            self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+        columns = ", ".join(f"{f} TEXT" for f in FIELDS)
+        self.conn.execute("CREATE TABLE meta(k TEXT PRIMARY KEY, v TEXT)")
+        self.conn.execute(
+            "CREATE TABLE sources("
+            "id INTEGER PRIMARY KEY, path TEXT UNIQUE, signature TEXT, rows INTEGER)"
+        )
+        self.conn.execute(
+            f"CREATE TABLE entries(src INTEGER, {columns}, tkey TEXT, "
+            "PRIMARY KEY(src, sha1))"
+        )
+        self.conn.execute(
+            f"CREATE TABLE games({columns}, tkey TEXT, src INTEGER, PRIMARY KEY(sha1))"
+        )
+        self.conn.execute("CREATE INDEX games_tkey ON games(tkey)")
+        self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def _index(self, src: int, csv_path: Path, signature: str, verbose: bool) -> None:
+        """(Re)load one source's rows; within a file the first row of a SHA1 wins."""
+        self.conn.execute("DELETE FROM entries WHERE src=?", (src,))
+        placeholders = ",".join("?" * (len(FIELDS) + 2))
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO entries VALUES ({placeholders})",
+            (
+                (src,)
+                + tuple(getattr(meta, f) for f in FIELDS)
+                + (meta_title_key(meta) if meta.title else None,)
+                for meta in iter_db(csv_path, verbose=verbose)
+            ),
+        )
+        self.conn.execute(
+            "UPDATE sources SET signature=?, "
+            "rows=(SELECT COUNT(*) FROM entries WHERE src=?) WHERE id=?",
+            (signature, src, src),
+        )
+
+    def _merge(self, order: List[int]) -> None:
+        columns = ", ".join(FIELDS)
+        self.conn.execute("DELETE FROM games")
+        for src in order:
+            self.conn.execute(
+                f"INSERT OR IGNORE INTO games({columns}, tkey, src) "
+                f"SELECT {columns}, tkey, src FROM entries WHERE src=?",
+                (src,),
+            )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta(k, v) VALUES ('order', ?)",
+            (",".join(map(str, order)),),
+        )
+
+    def __len__(self) -> int:
+        return int(self.conn.execute("SELECT COUNT(*) FROM games").fetchone()[0])
+
+    def get(self, sha1: str) -> Optional[GameMeta]:
+        row = self.conn.execute(
+            f"SELECT {', '.join(FIELDS)} FROM games WHERE sha1=?", (sha1,)
+        ).fetchone()
+        return GameMeta(*row) if row else None
+
+    def source_of(self, sha1: str) -> Optional[Path]:
+        """The CSV the entry for `sha1` was taken from."""
+        row = self.conn.execute(
+            "SELECT s.path FROM games g JOIN sources s ON s.id=g.src WHERE g.sha1=?",
+            (sha1,),
+        ).fetchone()
+        return Path(row[0]) if row else None
+
+    def provenance(self) -> List[Tuple[Path, int, int]]:
+        """(source, entries in it, entries taken from it), by priority."""
+        order = self.conn.execute("SELECT v FROM meta WHERE k='order'").fetchone()
+        used = dict(
+            self.conn.execute("SELECT src, COUNT(*) FROM games GROUP BY src")
+        )
+        rows = {
+            src: (Path(path), n)
+            for src, path, n in self.conn.execute("SELECT id, path, rows FROM sources")
+        }
+        return [
+            rows[src] + (used.get(src, 0),)
+            for src in map(int, order[0].split(","))
+            if src in rows
+        ]
+
+    def to_dict(self) -> Dict[str, GameMeta]:
+        """The merged entries as load_db() would return them, for in-memory runs."""
+        return {
+            row[FIELDS.index("sha1")]: GameMeta(*row)
+            for row in self.conn.execute(f"SELECT {', '.join(FIELDS)} FROM games")
+        }
+
+    def title_index(self) -> "DiskTitleIndex":
+        return DiskTitleIndex(self.conn)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class DiskTitleIndex:
+    """build_title_index() equivalent answered from the on-disk index."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def get(self, key: str) -> Optional[List[GameMeta]]:
+        # Two rows are enough to tell a unique title from an ambiguous one.
+        rows = self.conn.execute(
+            f"SELECT {', '.join(FIELDS)} FROM games WHERE tkey=? LIMIT 2", (key,)
+        ).fetchall()
+        return [GameMeta(*r) for r in rows] or None
@@ -0,0 +1,167 @@
+"""
+Cold hashing split across machines:
+
+    host A:  --shard 1/3 --cache hashcache.1.sqlite
+    host B:  --shard 2/3 --cache hashcache.2.sqlite
+    host C:  --shard 3/3 --cache hashcache.3.sqlite
+    then:    --merge-cache hashcache.*.sqlite --rewrite-prefix /mnt/b/roms=/nas/roms
+
+Each shard run walks romdir and hashes only the ROMs whose path relative to
+romdir falls in its shard, into its own cache, without matching or writing
+launchers. The merge folds the partial caches into --cache; the normal
+run that follows then only reads the merged cache.
+"""
+
+from __future__ import annotations
+
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .cachestore import CacheRow, detect_backend, open_backend
+from .config import SystemConfig
+from .datfile import load_dats
+from .organizer import (
+    BATCH_WINDOW,
+    LOW_MEMORY_WINDOW,
+    dat_may_match,
+    open_cache,
+    slot_index_for,
+)
+from .scan import iter_candidates
+from .throttle import make_throttle
+from .util import batched
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'2/4' -> (2, 4); shards are numbered from 1."""
+    index, sep, count = spec.partition("/")
+    try:
+        i, n = int(index), int(count)
+    except ValueError:
+        i = n = 0
+    if not sep or not 1 <= i <= n:
+        raise SystemExit(f"[ERR] --shard {spec!r}: expected I/N with 1 <= I <= N")
+    return i, n
+
+
+def in_shard(rel_path: str, index: int, count: int) -> bool:
+    """
+    Whether a ROM (path relative to romdir, posix separators) belongs to
+    shard `index` of `count`. Stable across hosts, mount points and Python
+    versions (CRC32, not hash()).
+    """
+    return zlib.crc32(rel_path.encode("utf-8")) % count == index - 1
+
+
+def hash_shard(cfg: SystemConfig, index: int, count: int) -> int:
+    """Hash shard `index`/`count` of romdir into cfg.cache_path."""
+    if not cfg.romdir.exists():
+        raise SystemExit(f"[ERR] ROM dir not found: {cfg.romdir}")
+    dat = load_dats(cfg.dat_paths) if cfg.dat_paths else None
+    exts = {e for s in cfg.slots for e in s.exts}
+
+    def selected() -> Iterable[Path]:
+        for rom in iter_candidates(cfg.romdir, exts):
+            if in_shard(rom.relative_to(cfg.romdir).as_posix(), index, count):
+                yield rom
+
+    cache = open_cache(cfg, make_throttle(cfg))
+    roms = prefiltered = 0
+    try:
+        window = LOW_MEMORY_WINDOW if cfg.low_memory else BATCH_WINDOW
+        for batch in batched(selected(), window):
+            to_hash = []
+            for rom in batch:
+                slot = cfg.slots[slot_index_for(cfg, rom.suffix)]
+                roms += 1
+                if dat is not None and not dat_may_match(dat, rom, slot):
+                    prefiltered += 1
+                    continue
+                to_hash.append((rom, slot.header))
+            cache.get_or_compute_many(to_hash)
+    finally:
+        cache.close()
+
+    print(f"\n[SHARD] {index}/{count} of {cfg.romdir}")
+    print(f"  ROMs in shard: {roms:,}")
+    print(f"  hashed:        {cache.hashed:,}")
+    print(f"  cache hits:    {cache.hits + cache.revalidated + cache.aliases:,}")
+    if dat is not None:
+        print(f"  size-filtered: {prefiltered:,}  (not hashed, no DAT size match)")
+    print(f"\nPartial cache: {cfg.cache_path.resolve()}")
+    return 0
+
+
+def parse_rewrite(spec: str) -> Tuple[str, str]:
+    old, sep, new = spec.partition("=")
+    if not sep or not old:
+        raise SystemExit(f"[ERR] --rewrite-prefix {spec!r}: expected OLD=NEW")
+    return old.rstrip("/"), new.rstrip("/")
+
+
+def rewrite_path(path: str, rewrites: Sequence[Tuple[str, str]]) -> str:
+    """Apply the first matching OLD=NEW prefix, on a path component boundary."""
+    for old, new in rewrites:
+        if path == old or path.startswith(old + "/"):
+            return new + path[len(old) :]
+    return path
+
+
+def merge_caches(
+    parts: Sequence[Path],
+    dest: Path,
+    backend: str,
+    rewrites: Sequence[Tuple[str, str]] = (),
+) -> int:
+    """
+    Fold partial caches (any backend) into `dest`. When several rows share
+    a path the one with the newest mtime wins. Inode numbers are dropped:
+    they belong to the host that hashed the file and are filled in again
+    by the first local lookup. The parts are only read, never modified.
+    """
+    rows: Dict[str, CacheRow] = {}
+    for part in parts:
+        if not part.exists():
+            raise SystemExit(f"[ERR] Cache not found: {part}")
+        store = open_backend(detect_backend(part), part, readonly=True)
+        count = 0
+        try:
+            for row in store.rows():
+                path = rewrite_path(row.path, rewrites)
+                current = rows.get(path)
+                if current is None or row.mtime >= current.mtime:
+                    rows[path] = CacheRow(
+                        path=path,
+                        size=row.size,
+                        mtime=row.mtime,
+                        sha1=row.sha1,
+                        sha1_nh=row.sha1_nh,
+                        fp=row.fp,
+                    )
+                count += 1
+        finally:
+            store.close()
+        print(f"[MERGE] {part}: {count:,} rows")
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    store = open_backend(backend, dest)
+    try:
+        store.put_many(rows.values())
+    finally:
+        store.close()
+    print(f"[MERGE] wrote {len(rows):,} rows to {dest.resolve()}")
+    return 0
+
+
+def merge_from_args(
+    cfg: SystemConfig, parts: List[Path], rewrite_specs: List[str]
+) -> int:
+    rewrites = [parse_rewrite(s) for s in rewrite_specs]
+    if cfg.cache_backend == "memory":
+        raise SystemExit(
+            "[ERR] --merge-cache needs a cache file, not --cache-backend memory"
+        )
+    if any(p.resolve() == cfg.cache_path.resolve() for p in parts):
+        raise SystemExit("[ERR] --merge-cache inputs must not include --cache itself")
+    return merge_caches(parts, cfg.cache_path, cfg.cache_backend, rewrites)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import re
+from itertools import product
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+from .csvdb import GameMeta
+from .util import menu_folder, safe_name
+
+FACETS = ("publisher", "developer", "genre", "year", "date")
+
+GENRE_RE = re.compile(r"#genre:([^\s>]+)(?:>([^\s]+))?")
+YEAR_RE = re.compile(r"^\s*(\d{4})\b")
+
+
+MONTH_NAMES = [
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+]
+
+
+def date_parts(release_date: str, depth: int) -> List[str]:
+    """
+    release_date: YYYY or YYYY-MM or YYYY-MM-DD (or empty)
+    depth: 1=Year, 2=Year/MonthName, 3=Year/MonthName/Day(01..31)
+    Stops early if month/day missing.
+    """
+    s = (release_date or "").strip()
+    if not s:
+        return ["Unknown"]
+
+    parts = s.split("-")
+    year = parts[0].strip() if len(parts) >= 1 else ""
+    if not year.isdigit() or len(year) != 4:
+        return ["Unknown"]
+
+    out = [year]
+
+    if depth >= 2 and len(parts) >= 2 and parts[1].isdigit():
+        m = int(parts[1])
+        if 1 <= m <= 12:
+            out.append(MONTH_NAMES[m - 1])
+
+    if depth >= 3 and len(parts) >= 3 and parts[2].isdigit():
+        d = int(parts[2])
+        if 1 <= d <= 31:
+            out.append(f"{d:02d}")
+
+    return out
+
+
+def genre_buckets(tags: str, depth: int) -> List[List[str]]:
+    """
+    Parse PigSaint-style genre tags.
+
+    Examples:
+      #genre:action:adventure
+        -> ["action"], ["adventure"]
+
+      #genre:sim>building>train
+        -> ["sim", "building"]   (if depth=2)
+
+      #genre:action>platformer:parlor>pachinko
+        -> ["action", "platformer"], ["parlor", "pachinko"] (if depth=2)
+    """
+    hits: List[List[str]] = []
+
+    for tok in (tags or "").split():
+        if not tok.startswith("#genre:"):
+            continue
+
+        rest = tok[len("#genre:") :].strip()
+        if not rest:
+            continue
+
+        # Split into multiple genre groups (colon-separated)
+        for group in rest.split(":"):
+            group = group.strip()
+            if not group:
+                continue
+
+            # Split hierarchy levels (greater-than separated)
+            levels = [lvl.strip() for lvl in group.split(">") if lvl.strip()]
+            if not levels:
+                continue
+
+            # Apply depth (1 or 2 in your CLI)
+            levels = levels[: max(1, depth)]
+            hits.append([safe_name(lvl) for lvl in levels])
+
+    return hits if hits else [["Unknown"]]
+
+
+def buckets_for(
+    meta: GameMeta, facet: str, genre_depth: int, date_depth: int
+) -> List[List[str]]:
+    facet = facet.lower()
+
+    if facet == "publisher":
+        return [[safe_name(meta.publisher)]]
+
+    if facet == "developer":
+        return [[safe_name(meta.developer)]]
+
+    if facet == "year":
+        m = YEAR_RE.match(meta.release_date or "")
+        y = m.group(1) if m else "Unknown"
+        return [[safe_name(y)]]
+
+    if facet == "date":
+        return [[safe_name(p) for p in date_parts(meta.release_date, date_depth)]]
+
+    if facet == "genre":
+        return genre_buckets(meta.tags, genre_depth)
+
+    raise ValueError(f"Unknown facet: {facet}")
+
+
+def facet_folder(facet: str, bucket: Sequence[str]) -> Path:
+    # underscore jungle: EVERY folder in path gets underscore
+    return Path(menu_folder(facet.title()), *[menu_folder(p) for p in bucket])
+
+
+def view_folders(
+    meta: GameMeta,
+    views: Sequence[Sequence[str]],
+    genre_depth: int,
+    date_depth: int,
+) -> Iterator[Path]:
+    """
+    Folders of one ROM in every view, e.g. ("genre",) -> _Genre/_<g> and
+    ("genre", "year") -> _Genre/_<g>/_Year/_<y>. Each facet's buckets are
+    computed once per ROM and shared by the views that use it, so another
+    view costs lookups and joins, not another pass over the tag string.
+    """
+    by_facet: Dict[str, List[Path]] = {}
+    for view in views:
+        for facet in view:
+            if facet not in by_facet:
+                by_facet[facet] = [
+                    facet_folder(facet, b)
+                    for b in buckets_for(meta, facet, genre_depth, date_depth)
+                ]
+        for combo in product(*(by_facet[f] for f in view)):
+            yield Path(*combo)
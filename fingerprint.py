@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Union
+
+from . import __version__
+from .config import SystemConfig
+
+# Fields that change how a run behaves but not what it produces.
+IGNORED_FIELDS = (
+    "dry_run",
+    "force",
+    "rescan",
+    "resume",
+    "max_read_mbps",
+    "max_iops",
+    "write_threads",
+    "fsync",
+)
+
+
+def fingerprint_path(cfg: SystemConfig) -> Path:
+    return cfg.state_dir / "fingerprint.json"
+
+
+def file_identity(path: Path) -> List[object]:
+    try:
+        st = path.stat()
+    except OSError:
+        return [str(path), None, None]
+    return [str(path), st.st_size, st.st_mtime_ns]
+
+
+def input_digest(cfg: SystemConfig) -> str:
+    """
+    Hash of everything a run's output depends on, except the ROM tree:
+    the configuration, the CSV and DAT files (size/mtime) and the tool version.
+    """
+    fields = {k: v for k, v in asdict(cfg).items() if k not in IGNORED_FIELDS}
+    payload = {
+        "version": __version__,
+        "config": repr(sorted(fields.items())),
+        "csv": [file_identity(p) for p in cfg.csv_paths],
+        "dats": [file_identity(p) for p in cfg.dat_paths],
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def dir_mtimes(dirs: Iterable[Union[str, Path]]) -> Dict[str, int]:
+    out = {}
+    for d in dirs:
+        try:
+            out[str(d)] = os.stat(d).st_mtime_ns
+        except OSError:
+            pass
+    return out
+
+
+def load_unchanged(cfg: SystemConfig, inputs: str) -> Optional[List[str]]:
+    """
+    The previous run's summary if nothing it depended on has changed.
+
+    The ROM tree signature is the mtime of every directory seen by that run,
+    plus outdir. Adding, removing or renaming a file changes its directory's
+    mtime, and a new subdirectory changes its parent's, so stat()ing the
+    known directories is enough; nothing is listed. A file rewritten in
+    place under the same name is not detected (use --force).
+    """
+    path = fingerprint_path(cfg)
+    try:
+        saved = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if saved.get("inputs") != inputs:
+        return None
+    dirs = saved.get("dirs") or {}
+    if not dirs or dir_mtimes(dirs) != dirs:
+        return None
+    return list(saved.get("summary") or [])
+
+
+def save_fingerprint(
+    cfg: SystemConfig,
+    inputs: str,
+    tree_dirs: Mapping[str, int],
+    summary: List[str],
+) -> None:
+    """
+    `tree_dirs` holds each directory's mtime from when the run listed it,
+    not a fresh stat: a file added after its directory was listed was not
+    processed, and must leave the tree looking changed to the next run.
+    """
+    path = fingerprint_path(cfg)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # outdir too: catches the output tree being removed or replaced.
+    dirs = {**tree_dirs, **dir_mtimes([cfg.outdir])}
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(
+        json.dumps({"inputs": inputs, "dirs": dirs, "summary": summary}),
+        encoding="utf-8",
+    )
+    os.replace(tmp, path)
+
+
+def invalidate(cfg: SystemConfig) -> None:
+    fingerprint_path(cfg).unlink(missing_ok=True)
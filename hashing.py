@@ -1,8 +1,19 @@
 from __future__ import annotations
 
 import hashlib
-import sqlite3
+import os
+from dataclasses import replace
 from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from .cachestore import CacheRow, open_backend
+from .profiles import HeaderRule
+from .throttle import IoThrottle
+
+
+class Digests(NamedTuple):
+    sha1: str  # whole file
+    headerless: Optional[str] = None  # file minus its dump header, if it has one
 
 
 def sha1_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
@@ -16,39 +27,308 @@ def sha1_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
     return h.hexdigest().lower()
 
 
+FINGERPRINT_BLOCK = 64 * 1024
+
+
+def fingerprint_windows(size: int) -> List[Tuple[int, int]]:
+    """Byte ranges sampled by the fingerprint: first, middle and last 64 KiB."""
+    out = []
+    for offset in (0, max(0, size // 2 - FINGERPRINT_BLOCK // 2), size):
+        start = max(0, min(offset, size - FINGERPRINT_BLOCK))
+        out.append((start, min(size, start + FINGERPRINT_BLOCK)))
+    return out
+
+
+def fingerprint_file(
+    path: Path, size: int, throttle: Optional[IoThrottle] = None
+) -> str:
+    """
+    Cheap content fingerprint: size plus the first, middle and last 64 KiB.
+    Used to revalidate a cached digest when only the mtime changed.
+    """
+    h = hashlib.sha1(str(size).encode("ascii"))
+    with path.open("rb") as f:
+        for start, end in fingerprint_windows(size):
+            if throttle is not None:
+                throttle.read(end - start)
+            f.seek(start)
+            h.update(f.read(end - start))
+    return h.hexdigest().lower()
+
+
+def _fadvise(fd: int, advice_name: str) -> None:
+    """Page-cache hint for the whole file; a no-op where unsupported."""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, advice)
+    except OSError:
+        pass
+
+
+def prefetch_file(path: Path) -> None:
+    """Ask the kernel to start reading `path` ahead of time."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        _fadvise(fd, "POSIX_FADV_WILLNEED")
+    finally:
+        os.close(fd)
+
+
+def hash_file(
+    path: Path,
+    header: HeaderRule | None = None,
+    chunk_size: int = 1024 * 1024,
+    throttle: Optional[IoThrottle] = None,
+) -> Tuple[Digests, str]:
+    """
+    One sequential read yielding the whole-file SHA1, the header-stripped SHA1
+    (if `header` is present) and the fingerprint_file() value.
+
+    The file is read with POSIX_FADV_SEQUENTIAL and dropped from the page
+    cache afterwards, so hashing a huge set does not evict everything else.
+    """
+    full = hashlib.sha1()
+    stripped = None
+    with path.open("rb") as f:
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        windows = fingerprint_windows(size)
+        samples = [bytearray() for _ in windows]
+        _fadvise(fd, "POSIX_FADV_SEQUENTIAL")
+
+        pos = 0
+        first = True
+        while True:
+            want = chunk_size
+            if first and header is not None:
+                want = max(chunk_size, header.offset + header.size)
+            b = f.read(want)
+            if not b:
+                break
+            if throttle is not None:
+                throttle.read(len(b))
+            full.update(b)
+            if first:
+                if header is not None and header.present(b, size):
+                    stripped = hashlib.sha1(b[header.size :])
+                first = False
+            elif stripped is not None:
+                stripped.update(b)
+            end = pos + len(b)
+            for (w_start, w_end), sample in zip(windows, samples):
+                if w_start < end and pos < w_end:
+                    sample += b[max(w_start, pos) - pos : min(w_end, end) - pos]
+            pos = end
+
+        _fadvise(fd, "POSIX_FADV_DONTNEED")
+
+    fp = hashlib.sha1(str(size).encode("ascii"))
+    for sample in samples:
+        fp.update(sample)
+    digests = Digests(
+        full.hexdigest().lower(),
+        stripped.hexdigest().lower() if stripped is not None else None,
+    )
+    return digests, fp.hexdigest().lower()
+
+
+def _same_file(row: CacheRow, dev: int, ino: int, size: int, mtime: float) -> bool:
+    """Whether `row`'s path is still the file with this identity."""
+    try:
+        st = os.stat(row.path)
+    except OSError:
+        return False
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime) == (dev, ino, size, mtime)
+
+
 class HashCache:
     """
-    SQLite cache keyed by (path,size,mtime) -> sha1.
+    Cache keyed by (path,size,mtime) -> sha1.
     Speeds up re-runs massively on big sets.
+
+    Rows also record (st_dev, st_ino), so hardlinks and bind-mounted aliases
+    of an already hashed file reuse its digest instead of being read again.
+    For headered formats the header-stripped digest is kept in `sha1_nh`
+    ("" = no header found, None = never checked).
+
+    A cheap fingerprint (see fingerprint_file) is stored as well. When a
+    file's mtime changed but its size and fingerprint did not (copies made
+    without preserving times, restores from backup), the cached digest is
+    revalidated instead of rehashing, unless the cache is `strict`.
+
+    Rows are kept by a backend from cachestore: "sqlite" (default),
+    "memory" or "log".
     """
 
-    def __init__(self, db_path: Path):
-        self.conn = sqlite3.connect(str(db_path))
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS filehash(
-                path TEXT PRIMARY KEY,
-                size INTEGER NOT NULL,
-                mtime REAL NOT NULL,
-                sha1 TEXT NOT NULL
+    def __init__(
+        self,
+        db_path: Path,
+        strict: bool = False,
+        backend: str = "sqlite",
+        chunk_size: int = 1024 * 1024,
+        throttle: Optional[IoThrottle] = None,
+    ):
+        self.strict = strict
+        # Paces file reads; also turns off read-ahead prefetching.
+        self.throttle = throttle
+        self.chunk_size = chunk_size
+        # Aliases are found through the store (indexed by dev, ino), not an
+        # in-run map, so memory does not grow with the number of files.
+        self.store = open_backend(backend, db_path)
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Zero the counters, e.g. before another run on a long-lived cache."""
+        self.hits = 0  # served from a cached row for the same path
+        self.aliases = 0  # served from another path to the same physical file
+        self.hashed = 0  # actually read and hashed
+        self.revalidated = 0  # mtime changed, fingerprint matched
+
+    def _alias(
+        self, dev: int, ino: int, size: int, mtime: float, header: bool
+    ) -> Optional[CacheRow]:
+        if not ino:
+            # Some filesystems (FAT, some SMB servers) report no inode numbers.
+            return None
+        while True:
+            found = self.store.find_inode(dev, ino, size, mtime, header)
+            if found is None or _same_file(found, dev, ino, size, mtime):
+                return found
+            # The row's path is gone or is another file now: its inode number
+            # was freed and reused (ext4 does), maybe with a preserved mtime.
+            self.store.delete(found.path)
+
+    def _lookup(
+        self, path: Path, st: os.stat_result, header: HeaderRule | None
+    ) -> Optional[Digests]:
+        key = (st.st_dev, st.st_ino)
+        row = self.store.get(str(path))
+        usable = (
+            row is not None
+            and row.size == st.st_size
+            and (header is None or row.sha1_nh is not None)
+        )
+        if usable and row.mtime != st.st_mtime:
+            # Same size, new mtime: trust the old digest only if the sampled
+            # blocks are unchanged.
+            usable = (
+                not self.strict
+                and row.fp is not None
+                and fingerprint_file(path, st.st_size, self.throttle) == row.fp
             )
-        """)
-        self.conn.commit()
+            if usable:
+                self.revalidated += 1
+                row = replace(row, mtime=st.st_mtime)
+                self.store.put(row)
+        elif usable:
+            self.hits += 1
+        if not usable:
+            return None
+        if (row.dev, row.ino) != key:
+            # Row predates inode tracking (or the file moved device).
+            row = replace(row, dev=st.st_dev, ino=st.st_ino)
+            self.store.put(row)
+        return Digests(row.sha1, row.sha1_nh or None)
 
-    def get_or_compute_sha1(self, path: Path) -> str:
-        st = path.stat()
-        row = self.conn.execute(
-            "SELECT size, mtime, sha1 FROM filehash WHERE path=?",
-            (str(path),),
-        ).fetchone()
-        if row and int(row[0]) == st.st_size and float(row[1]) == st.st_mtime:
-            return str(row[2])
-        digest = sha1_file(path)
-        self.conn.execute(
-            "INSERT OR REPLACE INTO filehash(path,size,mtime,sha1) VALUES (?,?,?,?)",
-            (str(path), st.st_size, st.st_mtime, digest),
+    def _compute(
+        self, path: Path, st: os.stat_result, header: HeaderRule | None
+    ) -> Digests:
+        found = self._alias(
+            st.st_dev, st.st_ino, st.st_size, st.st_mtime, header is not None
+        )
+        if found is not None:
+            self.aliases += 1
+            digest, headerless, fp = found.sha1, found.sha1_nh, found.fp
+        else:
+            self.hashed += 1
+            digests, fp = hash_file(path, header, self.chunk_size, self.throttle)
+            digest = digests.sha1
+            # "" records "checked, no header" so the file is not hashed again.
+            headerless = None if header is None else digests.headerless or ""
+        row = CacheRow(
+            path=str(path),
+            size=st.st_size,
+            mtime=st.st_mtime,
+            sha1=digest,
+            dev=st.st_dev,
+            ino=st.st_ino,
+            sha1_nh=headerless,
+            fp=fp,
         )
-        self.conn.commit()
-        return digest
+        self.store.put(row)
+        return Digests(digest, headerless or None)
+
+    def get_or_compute(self, path: Path, header: HeaderRule | None = None) -> Digests:
+        st = path.stat()
+        digests = self._lookup(path, st, header)
+        return digests if digests is not None else self._compute(path, st, header)
+
+    def _listed(
+        self, path: Path, size: int, mtime: float, header: HeaderRule | None
+    ) -> Optional[Digests]:
+        """A cached row matching size/mtime reported by a file list, unstat'ed."""
+        row = self.store.get(str(path))
+        if (
+            row is not None
+            and row.size == size
+            # find -printf %T@ and st_mtime may round differently.
+            and abs(row.mtime - mtime) < 1e-6
+            and (header is None or row.sha1_nh is not None)
+        ):
+            self.hits += 1
+            return Digests(row.sha1, row.sha1_nh or None)
+        return None
+
+    def get_or_compute_many(
+        self,
+        items: Iterable[Tuple[Path, HeaderRule | None]],
+        known: Optional[Mapping[Path, Tuple[int, float]]] = None,
+    ) -> Dict[Path, Digests]:
+        """
+        Digests for many files at once. Cache hits are served first; misses
+        are then hashed in (st_dev, st_ino) order, which follows on-disk
+        placement closely on most filesystems and avoids seeking between
+        directories, with the next file prefetched while one is hashed.
+
+        `known` maps paths to a (size, mtime) already reported by a file
+        list; files whose cached row agrees are not even stat()ed. Files
+        that no longer exist (a stale list, or deleted during the run) are
+        left out of the result.
+        """
+        out: Dict[Path, Digests] = {}
+        misses = []
+        for path, header in items:
+            if known and path in known:
+                digests = self._listed(path, *known[path], header)
+                if digests is not None:
+                    out[path] = digests
+                    continue
+            try:
+                st = path.stat()
+                digests = self._lookup(path, st, header)
+            except FileNotFoundError:
+                continue
+            if digests is None:
+                misses.append((st.st_dev, st.st_ino, path, st, header))
+            else:
+                out[path] = digests
+        misses.sort(key=lambda m: (m[0], m[1]))
+        for i, (_dev, _ino, path, st, header) in enumerate(misses):
+            if i + 1 < len(misses) and self.throttle is None:
+                prefetch_file(misses[i + 1][2])
+            try:
+                out[path] = self._compute(path, st, header)
+            except FileNotFoundError:
+                continue
+        return out
+
+    def get_or_compute_sha1(self, path: Path) -> str:
+        return self.get_or_compute(path).sha1
 
     def close(self) -> None:
-        self.conn.close()
+        self.store.close()
@@ -21,3 +21,43 @@ def make_mgl(
     out.append("</mistergamedescription>")
     return "\n".join(out) + "\n"
 
+
+# Stands in for the ROM path while a template is rendered; cannot occur in
+# a path or in the XML around it.
+_HOLE = "\0"
+
+
+class MglTemplate:
+    """
+    A launcher with everything but the ROM path already rendered. render()
+    gives exactly what make_mgl() would for the same arguments.
+    """
+
+    def __init__(self, chunks: tuple[str, ...]):
+        self.chunks = chunks
+
+    def render(self, rel_path: str) -> str:
+        if len(self.chunks) == 1:
+            return self.chunks[0]
+        return escape(rel_path).join(self.chunks)
+
+
+def compile_mgl(
+    rbf: str,
+    setname: str,
+    files: list[tuple[int, str, int, str | None]],
+    prefix: str = "",
+) -> MglTemplate:
+    """
+    Template for make_mgl(); a file whose path is None points at the ROM,
+    `prefix` + the path passed to render().
+    """
+    text = make_mgl(
+        rbf,
+        setname,
+        [
+            (delay, ftype, index, path if path is not None else prefix + _HOLE)
+            for delay, ftype, index, path in files
+        ],
+    )
+    return MglTemplate(tuple(text.split(_HOLE)))
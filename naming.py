@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
 from .csvdb import GameMeta
-from .util import safe_name, truncate_filename, unique_path
+from .util import safe_name, truncate_filename
+
+
+@dataclass(frozen=True)
+class Launcher:
+    """One planned .mgl file: menu folder (relative to outdir), name, content."""
+
+    folder: Path
+    name: str
+    mgl_text: str
 
 
 def make_display_name(meta: Optional[GameMeta], rom: Path, name_source: str) -> str:
@@ -22,27 +32,3 @@ def make_display_name(meta: Optional[GameMeta], rom: Path, name_source: str) ->
     if meta.game_id:
         display = f"{display} [{meta.game_id}]"
     return truncate_filename(safe_name(display))
-
-
-def write_mgl_file(target: Path, content: str, on_collision: str) -> bool:
-    """
-    Returns True if wrote a new file, False if skipped (already identical).
-    on_collision:
-      - "suffix": always create __2, __3... if target exists
-      - "skip-identical": if target exists and content identical, skip; otherwise suffix
-    """
-    if not target.exists():
-        target.write_text(content, encoding="utf-8")
-        return True
-
-    if on_collision == "skip-identical":
-        try:
-            existing = target.read_text(encoding="utf-8")
-            if existing == content:
-                return False
-        except Exception:
-            pass
-
-    p2 = unique_path(target)
-    p2.write_text(content, encoding="utf-8")
-    return True
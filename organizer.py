@@ -1,232 +1,668 @@
 from __future__ import annotations
 
-import re
+import itertools
+import os
+import shutil
+import sys
 from collections import Counter
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Iterable, List
-
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .catalog import (
+    CatalogEntry,
+    CatalogWriter,
+    JournalEntry,
+    RunJournal,
+    read_catalog,
+)
 from .config import SystemConfig
-from .csvdb import GameMeta, load_db
-from .hashing import HashCache
-from .mgl import make_mgl
-from .naming import make_display_name, write_mgl_file
-from .util import menu_folder, safe_name
-
-GENRE_RE = re.compile(r"#genre:([^\s>]+)(?:>([^\s]+))?")
-YEAR_RE = re.compile(r"^\s*(\d{4})\b")
-
-
-MONTH_NAMES = [
-    "January",
-    "February",
-    "March",
-    "April",
-    "May",
-    "June",
-    "July",
-    "August",
-    "September",
-    "October",
-    "November",
-    "December",
-]
-
-
-def date_parts(release_date: str, depth: int) -> List[str]:
+from .csvdb import (
+    GameMeta,
+    TitleIndex,
+    build_title_index,
+    load_db,
+    lookup_title,
+)
+from .datfile import DatIndex, load_dats
+from .dbindex import DiskDb
+from .facets import view_folders
+from .fingerprint import input_digest, invalidate, load_unchanged, save_fingerprint
+from .hashing import Digests, HashCache
+from .naming import Launcher, make_display_name
+from .profiles import Slot
+from .scan import DirCache, FileRecord, iter_candidates
+from .sharding import shard_launchers
+from .throttle import IoThrottle, make_throttle
+from .util import batched, menu_folder
+from .writer import LauncherWriter, replace_tree
+
+# --low-memory: hash buffer size and how many files are resolved per batch
+LOW_MEMORY_CHUNK = 64 * 1024
+LOW_MEMORY_WINDOW = 256
+# Files resolved and hashed together otherwise: large enough for the cache
+# to order reads by disk locality, small enough that memory does not grow
+# with the size of the library.
+BATCH_WINDOW = 4096
+
+# Anything with .get(sha1) -> GameMeta: load_db()'s dict or a DiskDb.
+GameDb = Union[Mapping[str, GameMeta], DiskDb]
+
+
+def slot_index_for(cfg: SystemConfig, suffix: str) -> int:
+    return cfg.slot_table.index_for(suffix)
+
+
+def render_mgl(cfg: SystemConfig, slot_index: int, rel_inside_romdir: str) -> str:
+    return cfg.slot_table.render(slot_index, rel_inside_romdir)
+
+
+def open_db(cfg: SystemConfig, verbose: bool = True) -> GameDb:
     """
-    release_date: YYYY or YYYY-MM or YYYY-MM-DD (or empty)
-    depth: 1=Year, 2=Year/MonthName, 3=Year/MonthName/Day(01..31)
-    Stops early if month/day missing.
+    The CSV(s) of `cfg`: an open DiskDb with --low-memory, else a dict. Several
+    CSVs are merged through the on-disk index, which only parses the ones that
+    changed; the merged entries are then read into the dict.
     """
-    s = (release_date or "").strip()
-    if not s:
-        return ["Unknown"]
-
-    parts = s.split("-")
-    year = parts[0].strip() if len(parts) >= 1 else ""
-    if not year.isdigit() or len(year) != 4:
-        return ["Unknown"]
-
-    out = [year]
-
-    if depth >= 2 and len(parts) >= 2 and parts[1].isdigit():
-        m = int(parts[1])
-        if 1 <= m <= 12:
-            out.append(MONTH_NAMES[m - 1])
-
-    if depth >= 3 and len(parts) >= 3 and parts[2].isdigit():
-        d = int(parts[2])
-        if 1 <= d <= 31:
-            out.append(f"{d:02d}")
-
-    return out
+    for path in cfg.csv_paths:
+        if not path.exists():
+            raise SystemExit(f"[ERR] CSV not found: {path}")
+    if not cfg.low_memory and not cfg.more_csv_paths:
+        return load_db(cfg.csv_path, verbose=verbose)
+    db = DiskDb(cfg.csv_paths, cfg.state_dir / "dbindex.sqlite", verbose=verbose)
+    if cfg.low_memory:
+        return db
+    try:
+        return db.to_dict()
+    finally:
+        db.close()
 
 
-def iter_roms(root: Path, exts: set[str]) -> Iterable[Path]:
-    for p in root.rglob("*"):
-        if p.is_file() and p.suffix.lower() in exts:
-            yield p
+# RomResult.status values
+WRITTEN = "written"  # at least one launcher was newly written
+UNCHANGED = "unchanged"  # every launcher already existed with this content
+PENDING = "pending"  # held for --max-per-folder sharding, written at the end
+PLANNED = "planned"  # --dry-run: nothing written
+NO_LAUNCHER = "none"  # unmatched, and --write-unmatched is off
+RESUMED = "resumed"  # --resume: done by the interrupted run, not redone
 
 
-def genre_buckets(tags: str, depth: int) -> List[List[str]]:
+class LauncherSink:
     """
-    Parse PigSaint-style genre tags.
-
-    Examples:
-      #genre:action:adventure
-        -> ["action"], ["adventure"]
-
-      #genre:sim>building>train
-        -> ["sim", "building"]   (if depth=2)
-
-      #genre:action>platformer:parlor>pachinko
-        -> ["action", "platformer"], ["parlor", "pachinko"] (if depth=2)
+    Plans and writes the launchers of a run, one ROM at a time: every view
+    folder of a matched ROM, or _Unmatched with --write-unmatched. With
+    --max-per-folder everything is held until flush() so oversized folders
+    can be sharded.
+
+    ROMs are written in scan order, so launchers sharing a folder (and any
+    __2 collision suffixes) come out the same as from a whole-run pass.
+    Writes may still be in flight until flush().
     """
-    hits: List[List[str]] = []
 
-    for tok in (tags or "").split():
-        if not tok.startswith("#genre:"):
-            continue
-
-        rest = tok[len("#genre:") :].strip()
-        if not rest:
-            continue
+    def __init__(self, cfg: SystemConfig, throttle: Optional[IoThrottle] = None):
+        self.cfg = cfg
+        self.writer = LauncherWriter(
+            cfg.on_collision, cfg.write_threads, cfg.fsync, throttle
+        )
+        self.views = [(f,) for f in cfg.facets] + [
+            tuple(v.split("/")) for v in cfg.views
+        ]
+        self.pending: Optional[List[Launcher]] = [] if cfg.max_per_folder else None
+        self.written = 0
+
+    def plan(
+        self, meta: Optional[GameMeta], rom: Path, mgl_text: str
+    ) -> List[Launcher]:
+        if meta:
+            display = make_display_name(meta, rom, self.cfg.name_source)
+            return [
+                Launcher(folder, display, mgl_text)
+                for folder in view_folders(
+                    meta, self.views, self.cfg.genre_depth, self.cfg.date_depth
+                )
+            ]
+        if self.cfg.write_unmatched:
+            display = make_display_name(None, rom, "rom")
+            return [Launcher(Path(menu_folder("Unmatched")), display, mgl_text)]
+        return []
+
+    def add(self, launchers: List[Launcher]) -> Tuple[str, int]:
+        """Write (or hold) one ROM's launchers; returns (status, newly written)."""
+        if not launchers:
+            return NO_LAUNCHER, 0
+        if self.pending is not None:
+            self.pending.extend(launchers)
+            return PENDING, 0
+        written = sum(self._write(launcher) for launcher in launchers)
+        self.written += written
+        return (WRITTEN if written else UNCHANGED), written
+
+    def add_rom(self, meta: Optional[GameMeta], rom: Path, mgl_text: str) -> None:
+        self.add(self.plan(meta, rom, mgl_text))
+
+    def _write(self, launcher: Launcher) -> bool:
+        return self.writer.write(
+            self.cfg.outdir / launcher.folder, launcher.name, launcher.mgl_text
+        )
+
+    def flush(self) -> None:
+        """Write held launchers and wait until every launcher is on disk."""
+        if self.pending:
+            for launcher in shard_launchers(self.pending, self.cfg.max_per_folder):
+                if self._write(launcher):
+                    self.written += 1
+            self.pending = []
+        self.writer.close()
+
+    def checkpoint(self) -> None:
+        """Wait until the launchers added so far are on disk."""
+        self.writer.wait()
+
+    def abort(self) -> None:
+        """Drop queued writes; those already started still complete."""
+        self.writer.close(cancel=True)
+
+
+def dat_may_match(
+    dat: DatIndex, rom: Path, slot: Slot, size: Optional[int] = None
+) -> bool:
+    if size is None:
+        size = rom.stat().st_size
+    if dat.may_match(size):
+        return True
+    # DAT sizes are headerless, like the DB hashes.
+    return slot.header is not None and dat.may_match(size - slot.header.size)
+
+
+def open_cache(cfg: SystemConfig, throttle: Optional[IoThrottle] = None) -> HashCache:
+    cfg.cache_path.parent.mkdir(parents=True, exist_ok=True)
+    return HashCache(
+        cfg.cache_path,
+        strict=cfg.strict_cache,
+        backend=cfg.cache_backend,
+        chunk_size=LOW_MEMORY_CHUNK if cfg.low_memory else 1024 * 1024,
+        throttle=throttle,
+    )
+
+
+def dircache_stats(dircache: DirCache) -> str:
+    return (
+        f"directories={dircache.unchanged + dircache.listed:,}  "
+        f"(unchanged={dircache.unchanged:,}, listed={dircache.listed:,})"
+    )
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, if the OS reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def lookup_digests(db: GameDb, digests: Digests) -> Tuple[Optional[GameMeta], bool]:
+    """DB entry for a ROM's digests, and whether it matched headerless."""
+    meta = db.get(digests.sha1)
+    if meta is None and digests.headerless:
+        meta = db.get(digests.headerless)
+        return meta, meta is not None
+    return meta, False
+
+
+@dataclass(frozen=True)
+class RomResult:
+    """What a run did with one ROM candidate."""
+
+    path: Path
+    rel_path: str  # relative to romdir, posix separators
+    slot: int  # index into SystemConfig.slots
+    digests: Optional[Digests]  # None when not hashed
+    meta: Optional[GameMeta]
+    matched_by: Optional[str]  # "sha1" | "headerless" | "filename" | None
+    size_filtered: bool  # skipped by the --dat size pre-filter
+    targets: Tuple[Path, ...]  # planned launchers, relative to outdir
+    status: str  # WRITTEN, UNCHANGED, PENDING, PLANNED, NO_LAUNCHER or RESUMED
+    written: int  # launchers newly written for this ROM
+
+
+class SystemRun:
+    """
+    One run over a system's ROMs, consumed as a stream of RomResult while
+    it progresses. run_system() is the command line consumer.
+
+    `files` replaces the romdir walk with already known paths, or
+    FileRecords carrying size and mtime (see read_file_list); those whose
+    extension is in a slot and that lie under romdir are used. Such partial
+    runs leave the catalog alone. `db` and `cache` let a long-running caller
+    reuse a loaded CSV and an open hash cache, which are then left open.
+
+    Closing the iterator early cancels the run: launchers already written
+    stay, the catalog is not replaced. The counters are final once the
+    iteration has finished.
+    """
 
-        # Split into multiple genre groups (colon-separated)
-        for group in rest.split(":"):
-            group = group.strip()
-            if not group:
+    def __init__(
+        self,
+        cfg: SystemConfig,
+        files: Optional[Iterable[Union[Path, FileRecord]]] = None,
+        db: Optional[GameDb] = None,
+        cache: Optional[HashCache] = None,
+        verbose: bool = False,
+    ):
+        self.cfg = cfg
+        self.files = files
+        self.db = db
+        self.cache = cache
+        self.verbose = verbose
+
+        self.exts = {e for s in cfg.slots for e in s.exts}
+        self.ext_counts: Counter = Counter()
+        # Directories walked and their mtime when listed, for the no-op
+        # fingerprint; None without a walk.
+        self.tree_dirs: Optional[Dict[str, int]] = {} if files is None else None
+        self.dircache: Optional[DirCache] = None
+        # file list runs: (size, mtime) reported by the list, per candidate
+        self.known: Dict[Path, Tuple[int, float]] = {}
+        self.outside = self.missing = 0
+        self.title_index: Optional[TitleIndex] = None
+        self.dat: Optional[DatIndex] = None
+        # A cache passed in keeps its own throttle; writes share it.
+        self.throttle = cache.throttle if cache is not None else make_throttle(cfg)
+        self.sink = LauncherSink(cfg, self.throttle)
+        self.matched = self.unmatched = 0
+        self.by_name = self.prefiltered = self.headerless = 0
+        self.resumed = 0
+        self.journal: Optional[RunJournal] = None
+        self.completed = False
+
+    @property
+    def total(self) -> int:
+        return self.matched + self.unmatched
+
+    def _candidates(self) -> Iterator[Path]:
+        if self.files is None:
+            self.dircache = DirCache(
+                self.cfg.state_dir / "dircache.sqlite", rescan=self.cfg.rescan
+            )
+            yield from iter_candidates(
+                self.cfg.romdir,
+                self.exts,
+                self.ext_counts,
+                self.tree_dirs,
+                self.dircache,
+            )
+            return
+        romdir = os.path.abspath(self.cfg.romdir)
+        for item in self.files:
+            record = item if isinstance(item, FileRecord) else FileRecord(Path(item))
+            suffix = record.path.suffix.lower()
+            self.ext_counts[suffix] += 1
+            if suffix not in self.exts:
                 continue
-
-            # Split hierarchy levels (greater-than separated)
-            levels = [lvl.strip() for lvl in group.split(">") if lvl.strip()]
-            if not levels:
+            rel = os.path.relpath(os.path.abspath(record.path), romdir)
+            if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+                self.outside += 1
                 continue
+            # Same spelling as a walk would produce, so cache rows are shared.
+            rom = self.cfg.romdir / rel
+            if record.size is not None and record.mtime is not None:
+                # Trusted as reported; the cache may skip stat() entirely.
+                self.known[rom] = (record.size, record.mtime)
+            elif not rom.is_file():
+                self.missing += 1
+                continue
+            yield rom
+
+    def _print_scan(self, candidates: int) -> None:
+        cfg = self.cfg
+        source = cfg.romdir if self.files is None else "file list"
+        print(f"[ROMDIR] {source}  files={sum(self.ext_counts.values()):,}")
+        if self.dircache is not None:
+            print(f"[ROMDIR] {dircache_stats(self.dircache)}")
+        print(f"[ROMDIR] top extensions: {self.ext_counts.most_common(8)}")
+        print(f"[ROMDIR] ROM candidates={candidates:,}  (exts={sorted(self.exts)})")
+        if self.outside or self.missing:
+            print(
+                f"[ROMDIR] skipped: {self.outside:,} outside {cfg.romdir}, "
+                f"{self.missing:,} missing"
+            )
 
-            # Apply depth (1 or 2 in your CLI)
-            levels = levels[: max(1, depth)]
-            hits.append([safe_name(lvl) for lvl in levels])
-
-    return hits if hits else [["Unknown"]]
-
-
-def buckets_for(
-    meta: GameMeta, facet: str, genre_depth: int, date_depth: int
-) -> List[List[str]]:
-    facet = facet.lower()
-
-    if facet == "publisher":
-        return [[safe_name(meta.publisher)]]
-
-    if facet == "developer":
-        return [[safe_name(meta.developer)]]
-
-    if facet == "year":
-        m = YEAR_RE.match(meta.release_date or "")
-        y = m.group(1) if m else "Unknown"
-        return [[safe_name(y)]]
-
-    if facet == "date":
-        return [[safe_name(p) for p in date_parts(meta.release_date, date_depth)]]
-
-    if facet == "genre":
-        return genre_buckets(meta.tags, genre_depth)
+    def __iter__(self) -> Iterator[RomResult]:
+        cfg = self.cfg
+        if self.files is None and not cfg.romdir.exists():
+            raise SystemExit(f"[ERR] ROM dir not found: {cfg.romdir}")
+
+        # Everything is streamed: the walk (or file list) feeds batches of
+        # BATCH_WINDOW ROMs through hashing and writing, and the extension
+        # histogram and candidate count are complete only at the end. The
+        # first candidate is looked for up front, so that an empty selection
+        # fails before the catalog is replaced.
+        candidates = self._candidates()
+        first = next(candidates, None)
+        if first is None:
+            if self.dircache is not None:
+                self.dircache.close()
+            if self.verbose:
+                self._print_scan(0)
+            raise SystemExit(
+                "[ERR] No ROM candidates found. Adjust extensions or folder."
+            )
+        roms = itertools.chain([first], candidates)
+
+        own_db = self.db is None
+        if own_db:
+            self.db = open_db(cfg, verbose=self.verbose)
+        db = self.db
+        if cfg.match_mode == "filename":
+            self.title_index = (
+                db.title_index() if isinstance(db, DiskDb) else build_title_index(db)
+            )
+        if cfg.dat_paths:
+            self.dat = load_dats(cfg.dat_paths, verbose=self.verbose)
+
+        # Ensure output directory exists so SQLite can create/open the cache DB.
+        cfg.outdir.mkdir(parents=True, exist_ok=True)
+        own_cache = self.cache is None
+        if own_cache:
+            self.cache = open_cache(cfg, self.throttle)
+        cache = self.cache
+
+        catalog = None
+        if not cfg.dry_run and self.files is None:
+            catalog = CatalogWriter(cfg.catalog_path)
+            if not cfg.max_per_folder:
+                # (--max-per-folder writes nothing before the end.)
+                self.journal = RunJournal(
+                    cfg.journal_path, input_digest(cfg), cfg.resume
+                )
+        journal = self.journal
+        try:
+            # Resolve what we can without reading files, then hash the rest of
+            # each batch at once so the cache can order reads by disk locality.
+            window = LOW_MEMORY_WINDOW if cfg.low_memory else BATCH_WINDOW
+            for batch in batched(roms, window):
+                yield from self._run_batch(batch, catalog)
+                if journal is not None:
+                    # Checkpoint: the batch's launchers are on disk.
+                    self.sink.checkpoint()
+                    journal.flush()
+                if cfg.max_rss_mb:
+                    peak = peak_rss_mb()
+                    if peak is not None and peak > cfg.max_rss_mb:
+                        raise SystemExit(
+                            f"[ERR] peak RSS {peak:.0f} MiB exceeds --max-rss-mb "
+                            f"{cfg.max_rss_mb}"
+                        )
+            self.sink.flush()
+        except BaseException:
+            self.sink.abort()
+            if catalog is not None:
+                catalog.abort()
+            if journal is not None:
+                journal.close(completed=False)
+            raise
+        else:
+            if catalog is not None:
+                catalog.commit()
+            if journal is not None:
+                journal.close(completed=True)
+            self.completed = True
+        finally:
+            if own_cache:
+                cache.close()
+            if own_db and isinstance(db, DiskDb):
+                db.close()
+            if self.dircache is not None:
+                # Prune directories gone from the tree only after a full walk.
+                self.dircache.close(complete=self.completed)
+
+        if self.verbose:
+            print()
+            self._print_scan(self.total)
+
+    def _run_batch(
+        self, batch: List[Path], catalog: Optional[CatalogWriter]
+    ) -> Iterator[RomResult]:
+        cfg = self.cfg
+        resolved = []
+        to_hash = []
+        journal = self.journal
+        for rom in batch:
+            if journal is not None and journal.resuming:
+                done = journal.match(rom.relative_to(cfg.romdir).as_posix())
+                if done is not None:
+                    slot_index = done.entry.slot
+                    resolved.append((rom, slot_index, None, done.size_filtered, done))
+                    continue
+            slot_index = slot_index_for(cfg, rom.suffix)
+            slot = cfg.slots[slot_index]
+            meta = None
+            if self.title_index is not None:
+                meta = lookup_title(self.title_index, rom.stem)
+            filtered = False
+            if meta is not None:
+                # Filename trust: the stem names one DB entry, skip hashing.
+                self.by_name += 1
+            elif self.dat is not None and not dat_may_match(
+                self.dat, rom, slot, self.known.get(rom, (None,))[0]
+            ):
+                # No DAT entry has this size: unmatched without reading it.
+                self.prefiltered += 1
+                filtered = True
+            else:
+                to_hash.append((rom, slot.header))
+            resolved.append((rom, slot_index, meta, filtered, None))
+        hashed = self.cache.get_or_compute_many(to_hash, self.known)
+        for rom in batch:
+            self.known.pop(rom, None)
+        # Listed (or walked) but gone by the time it was to be read.
+        gone = {rom for rom, _ in to_hash if rom not in hashed}
+        self.missing += len(gone)
+
+        for rom, slot_index, meta, filtered, done in resolved:
+            if rom in gone:
+                continue
+            rel_inside_romdir = rom.relative_to(cfg.romdir).as_posix()
+            if done is not None:
+                # Finished by the interrupted run: counted, not redone.
+                entry = done.entry
+                meta = self.db.get(entry.key) if entry.key else None
+                digests = Digests(entry.sha1, None) if entry.sha1 else None
+                matched_by = done.matched_by
+                self.resumed += 1
+                self.by_name += matched_by == "filename"
+                self.headerless += matched_by == "headerless"
+                self.prefiltered += filtered
+            else:
+                digests = hashed.get(rom)
+                matched_by = "filename" if meta is not None else None
+                if digests:
+                    meta, stripped = lookup_digests(self.db, digests)
+                    self.headerless += stripped
+                    if meta is not None:
+                        matched_by = "headerless" if stripped else "sha1"
+                entry = CatalogEntry(
+                    path=rel_inside_romdir,
+                    sha1=digests.sha1 if digests else None,
+                    slot=slot_index,
+                    key=meta.sha1 if meta else None,
+                )
+
+            mgl_text = render_mgl(cfg, slot_index, rel_inside_romdir)
 
-    raise ValueError(f"Unknown facet: {facet}")
+            if meta:
+                self.matched += 1
+            else:
+                self.unmatched += 1
+            launchers = self.sink.plan(meta, rom, mgl_text)
+            if done is not None:
+                status, written = RESUMED, 0
+            elif cfg.dry_run:
+                status, written = (PLANNED if launchers else NO_LAUNCHER), 0
+            else:
+                status, written = self.sink.add(launchers)
+            if catalog is not None:
+                catalog.add(entry)
+            if self.journal is not None and done is None:
+                self.journal.add(JournalEntry(entry, matched_by, filtered))
+            yield RomResult(
+                path=rom,
+                rel_path=rel_inside_romdir,
+                slot=slot_index,
+                digests=digests,
+                meta=meta,
+                matched_by=matched_by,
+                size_filtered=filtered,
+                targets=tuple(x.folder / f"{x.name}.mgl" for x in launchers),
+                status=status,
+                written=written,
+            )
 
 
-def run_system(cfg: SystemConfig) -> int:
-    if not cfg.csv_path.exists():
-        raise SystemExit(f"[ERR] CSV not found: {cfg.csv_path}")
-    if not cfg.romdir.exists():
-        raise SystemExit(f"[ERR] ROM dir not found: {cfg.romdir}")
+def run_system(
+    cfg: SystemConfig,
+    db: Optional[GameDb] = None,
+    cache: Optional[HashCache] = None,
+    files: Optional[Iterable[Union[Path, FileRecord]]] = None,
+) -> int:
+    """
+    Run one system, printing progress and a summary. `files`, `db` and
+    `cache` are passed to SystemRun (see --files-from and server.py).
+    """
+    inputs = input_digest(cfg)
+    if files is None and not cfg.dry_run and not cfg.force and not cfg.rescan:
+        previous = load_unchanged(cfg, inputs)
+        if previous is not None:
+            print(f"[NOOP] inputs unchanged since the last run of {cfg.outdir}")
+            print("\n".join(previous))
+            return 0
+
+    run = SystemRun(cfg, files=files, db=db, cache=cache, verbose=True)
+    for _ in run:
+        pass
+    cache = run.cache
+
+    total = run.total
+    summary = ["", "[SUMMARY]"]
+    summary.append(f"  total scanned: {total:,}")
+    summary.append(f"  matched:       {run.matched:,}")
+    summary.append(f"  unmatched:     {run.unmatched:,}")
+    if total:
+        summary.append(f"  match rate:    {run.matched / total * 100:.1f}%")
+    if run.title_index is not None:
+        summary.append(f"  by filename:   {run.by_name:,}  (not hashed)")
+    if run.headerless:
+        summary.append(
+            f"  by headerless: {run.headerless:,}  (matched after stripping header)"
+        )
+    summary.append(f"  hashed:        {cache.hashed:,}")
+    summary.append(f"  cache hits:    {cache.hits:,}")
+    if cache.revalidated:
+        summary.append(
+            f"  revalidated:   {cache.revalidated:,}  (mtime changed, content same)"
+        )
+    if cache.aliases:
+        summary.append(f"  hardlinks:     {cache.aliases:,}  (same file, hashed once)")
+    if run.resumed:
+        summary.append(
+            f"  resumed:       {run.resumed:,}  (done by the interrupted run)"
+        )
+    if run.throttle is not None:
+        summary.append(f"  throttled:     {run.throttle.waited:.1f}s  (I/O limits)")
+    if run.dat is not None:
+        summary.append(
+            f"  size-filtered: {run.prefiltered:,}  (not hashed, no DAT size match)"
+        )
+    peak = peak_rss_mb()
+    if peak is not None:
+        summary.append(f"  peak RSS:      {peak:.0f} MiB")
+    if cfg.dry_run:
+        summary += ["", "(dry-run) No MGL files were written."]
+    else:
+        summary += ["", f"Wrote MGL files: {run.sink.written:,}"]
+        summary.append(f"Output folder:   {cfg.outdir.resolve()}")
 
-    db = load_db(cfg.csv_path, verbose=True)
+    print("\n".join(summary))
 
-    all_files = list(cfg.romdir.rglob("*"))
-    ext_counts = Counter(p.suffix.lower() for p in all_files if p.is_file())
-    print(f"[ROMDIR] {cfg.romdir}  files={sum(ext_counts.values()):,}")
-    print(f"[ROMDIR] top extensions: {ext_counts.most_common(8)}")
+    if cfg.dry_run:
+        pass
+    elif run.tree_dirs is not None:
+        save_fingerprint(cfg, inputs, run.tree_dirs, summary)
+    else:
+        # A file list run changed the tree outside a full run.
+        invalidate(cfg)
+    return 0
 
-    exts = {e for s in cfg.slots for e in s.exts}
-    roms = list(iter_roms(cfg.romdir, exts))
-    print(f"[ROMDIR] ROM candidates={len(roms):,}  (exts={sorted(exts)})")
-    if not roms:
-        raise SystemExit("[ERR] No ROM candidates found. Adjust extensions or folder.")
 
-    # Ensure output directory exists so SQLite can create/open the cache DB.
-    cfg.outdir.mkdir(parents=True, exist_ok=True)
-    cache_path = cfg.cache_path
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
-    cache = HashCache(cache_path)
+def refacet_system(cfg: SystemConfig, prune: bool = False) -> int:
+    """
+    Regenerate the launcher tree from the catalog of the last full run and
+    the CSV, without walking romdir or reading any ROM.
 
-    matched = unmatched = written = 0
+    With `prune` the tree is built in a staging folder and then replaces
+    the launchers in outdir, so it ends up as from a clean run: launchers
+    of facets, names or ROMs no longer planned are deleted, unchanged ones
+    are not rewritten.
+    """
+    db = open_db(cfg)
+    print(f"[CATALOG] {cfg.catalog_path}")
+    if not cfg.dry_run:
+        # The tree no longer matches the last full run's inputs.
+        invalidate(cfg)
+
+    staging = cfg.state_dir / "refacet"
+    if prune and not cfg.dry_run:
+        shutil.rmtree(staging, ignore_errors=True)  # left by an interrupted run
+        sink = LauncherSink(replace(cfg, outdir=staging), make_throttle(cfg))
+    else:
+        sink = LauncherSink(cfg, make_throttle(cfg))
+    matched = unmatched = 0
     try:
-        for rom in roms:
-            sha1 = cache.get_or_compute_sha1(rom)
-            meta = db.get(sha1)
-
-            rel_inside_romdir = rom.relative_to(cfg.romdir).as_posix()
-            mgl_target_path = f"{cfg.prefix_in_core}/{rel_inside_romdir}"
-
-            slot = next(
-                (s for s in cfg.slots if rom.suffix.lower() in s.exts),
-                cfg.slots[0],
-            )
-            files = []
-            for entry in slot.files:
-                path = entry.path if entry.path is not None else mgl_target_path
-                files.append((entry.delay, entry.file_type, entry.index, path))
-            mgl_text = make_mgl(
-                rbf=cfg.rbf,
-                setname=cfg.setname,
-                files=files,
-            )
+        for entry in read_catalog(cfg.catalog_path):
+            meta = db.get(entry.key) if entry.key else None
+            rom = Path(entry.path)
+            slot_index = entry.slot
+            if not (
+                0 <= slot_index < len(cfg.slots)
+                and rom.suffix.lower() in cfg.slots[slot_index].exts
+            ):
+                # Slots changed since the catalog was written (e.g. other --ext).
+                slot_index = slot_index_for(cfg, rom.suffix)
+            mgl_text = render_mgl(cfg, slot_index, entry.path)
 
             if meta:
                 matched += 1
-                display = make_display_name(meta, rom, cfg.name_source)
-
-                if not cfg.dry_run:
-                    for facet in cfg.facets:
-                        for parts in buckets_for(
-                            meta, facet, cfg.genre_depth, cfg.date_depth
-                        ):
-                            # underscore jungle: EVERY folder in path gets underscore
-                            folder = (
-                                cfg.outdir
-                                / menu_folder(facet.title())
-                                / Path(*[menu_folder(p) for p in parts])
-                            )
-                            folder.mkdir(parents=True, exist_ok=True)
-
-                            target = folder / f"{display}.mgl"
-                            if write_mgl_file(target, mgl_text, cfg.on_collision):
-                                written += 1
             else:
                 unmatched += 1
-                if cfg.write_unmatched and not cfg.dry_run:
-                    display = make_display_name(None, rom, "rom")
-                    folder = cfg.outdir / menu_folder("Unmatched")
-                    folder.mkdir(parents=True, exist_ok=True)
-                    target = folder / f"{display}.mgl"
-                    if write_mgl_file(target, mgl_text, cfg.on_collision):
-                        written += 1
+            if not cfg.dry_run:
+                sink.add_rom(meta, rom, mgl_text)
+    except BaseException:
+        sink.abort()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    sink.flush()
+    if isinstance(db, DiskDb):
+        db.close()
+    written = sink.written
+    removed = 0
+    if prune and not cfg.dry_run:
+        written, removed = replace_tree(staging, cfg.outdir, cfg.state_dir, cfg.fsync)
 
-    finally:
-        cache.close()
-
-    total = matched + unmatched
     print("\n[SUMMARY]")
-    print(f"  total scanned: {total:,}")
+    print(f"  catalog ROMs:  {matched + unmatched:,}")
     print(f"  matched:       {matched:,}")
     print(f"  unmatched:     {unmatched:,}")
-    if total:
-        print(f"  match rate:    {matched / total * 100:.1f}%")
     if cfg.dry_run:
         print("\n(dry-run) No MGL files were written.")
     else:
         print(f"\nWrote MGL files: {written:,}")
+        if prune:
+            print(f"Removed MGL files: {removed:,}  (no longer planned)")
         print(f"Output folder:   {cfg.outdir.resolve()}")
 
     return 0
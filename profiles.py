@@ -1,6 +1,37 @@
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Tuple
+
+from .mgl import MglTemplate, compile_mgl
+
+
+@dataclass(frozen=True)
+class HeaderRule:
+    """
+    A dump header that GameDataBase hashes leave out (iNES, SMC copier, A78...).
+    The header is `size` bytes at the start of the file and is only assumed
+    present if one of `magic` is found at `offset`, or, for magic-less
+    copier headers, if the file size modulo `modulo` equals `size`.
+    """
+
+    size: int
+    magic: tuple[bytes, ...] = ()
+    offset: int = 0
+    modulo: int = 0
+
+    def present(self, head: bytes, file_size: int) -> bool:
+        if file_size <= self.size:
+            return False
+        if self.magic:
+            field = head[self.offset :]
+            return any(field.startswith(m) for m in self.magic)
+        if self.modulo:
+            return file_size % self.modulo == self.size
+        return True
 
 
 @dataclass(frozen=True)
@@ -14,6 +45,16 @@ class SystemProfile:
     exts: tuple[str, ...]
     prefix_in_core: str = "nointro"
     slots: tuple["Slot", ...] | None = None
+    header: HeaderRule | None = None  # for the default slot
+
+    def effective_slots(self) -> tuple["Slot", ...]:
+        """`slots`, or the single slot described by the file_* fields."""
+        if self.slots:
+            return self.slots
+        file = FileEntry(
+            delay=self.file_delay, file_type=self.file_type, index=self.file_index
+        )
+        return (Slot(exts=self.exts, files=(file,), header=self.header),)
 
 
 @dataclass(frozen=True)
@@ -28,490 +69,211 @@ class FileEntry:
 class Slot:
     exts: tuple[str, ...]
     files: tuple[FileEntry, ...]
+    header: HeaderRule | None = None
 
 
-PROFILES: dict[str, SystemProfile] = {
-    "amiga": SystemProfile(
-        system="amiga",
-        rbf="_Computer/Minimig",
-        setname="Amiga",
-        file_delay=1,
-        file_index=0,
-        file_type="f",
-        exts=(".adf",),
-        prefix_in_core="nointro",
-    ),
-    "arcadia": SystemProfile(
-        system="arcadia",
-        rbf="_Console/Arcadia",
-        setname="Arcadia",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin",),
-        prefix_in_core="nointro",
-    ),
-    "avision": SystemProfile(
-        system="avision",
-        rbf="_Console/AdventureVision",
-        setname="AVision",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin",),
-        prefix_in_core="nointro",
-    ),
-    "astrocade": SystemProfile(
-        system="astrocade",
-        rbf="_Console/Astrocade",
-        setname="Astrocade",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin",),
-        prefix_in_core="nointro",
-    ),
-    "atari2600": SystemProfile(
-        system="atari2600",
-        rbf="_Console/Atari7800",
-        setname="ATARI2600",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".a78", ".a26", ".bin"),
-        prefix_in_core="nointro",
-    ),
-    "atari5200": SystemProfile(
-        system="atari5200",
-        rbf="_Console/Atari5200",
-        setname="ATARI5200",
-        file_delay=1,
-        file_index=1,
-        file_type="s",
-        exts=(".car", ".a52", ".bin", ".rom"),
-        prefix_in_core="nointro",
-    ),
-    "atari7800": SystemProfile(
-        system="atari7800",
-        rbf="_Console/Atari7800",
-        setname="ATARI7800",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".a78", ".a26", ".bin"),
-        prefix_in_core="nointro",
-    ),
-    "atarilynx": SystemProfile(
-        system="atarilynx",
-        rbf="_Console/AtariLynx",
-        setname="AtariLynx",
-        file_delay=1,
-        file_index=0,
-        file_type="f",
-        exts=(".lnx",),
-        prefix_in_core="nointro",
-    ),
-    "c64": SystemProfile(
-        system="c64",
-        rbf="_Computer/C64",
-        setname="C64",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".prg", ".crt", ".reu", ".tap", ".d64"),
-        prefix_in_core="nointro",
-        slots=(
-            Slot(
-                exts=(".d64",),
-                files=(
-                    FileEntry(delay=1, file_type="s", index=0),
-                    FileEntry(delay=0, file_type="f", index=1, path="autorun.prg"),
-                ),
-            ),
-            Slot(
-                exts=(".prg", ".crt", ".reu", ".tap"),
-                files=(FileEntry(delay=1, file_type="f", index=1),),
-            ),
-        ),
-    ),
-    "channelf": SystemProfile(
-        system="channelf",
-        rbf="_Console/ChannelF",
-        setname="ChannelF",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".rom", ".bin"),
-        prefix_in_core="nointro",
-    ),
-    "coleco": SystemProfile(
-        system="coleco",
-        rbf="_Console/ColecoVision",
-        setname="Coleco",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".col", ".bin", ".rom", ".sg"),
-        prefix_in_core="nointro",
-        slots=(
-            Slot(
-                exts=(".col", ".bin", ".rom"),
-                files=(FileEntry(delay=1, file_type="f", index=1),),
-            ),
-            Slot(
-                exts=(".sg",),
-                files=(FileEntry(delay=1, file_type="f", index=2),),
-            ),
-        ),
-    ),
-    "creativision": SystemProfile(
-        system="creativision",
-        rbf="_Console/CreatiVision",
-        setname="CreatiVision",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".rom", ".bin"),
-        prefix_in_core="nointro",
-    ),
-    "gameboy2p": SystemProfile(
-        system="gameboy2p",
-        rbf="_Console/Gameboy2P",
-        setname="GAMEBOY2P",
-        file_delay=2,
-        file_index=1,
-        file_type="f",
-        exts=(".gb", ".gbc"),
-        prefix_in_core="nointro",
-    ),
-    "gameboy": SystemProfile(
-        system="gameboy",
-        rbf="_Console/Gameboy",
-        setname="GAMEBOY",
-        file_delay=2,
-        file_index=1,
-        file_type="f",
-        exts=(".gb", ".gbc"),
-        prefix_in_core="nointro",
-    ),
-    "gbc": SystemProfile(
-        system="gbc",
-        rbf="_Console/Gameboy",
-        setname="GBC",
-        file_delay=2,
-        file_index=1,
-        file_type="f",
-        exts=(".gbc",),
-        prefix_in_core="nointro",
-    ),
-    "gamate": SystemProfile(
-        system="gamate",
-        rbf="_Console/Gamate",
-        setname="Gamate",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin",),
-        prefix_in_core="nointro",
-    ),
-    "gamenwatch": SystemProfile(
-        system="gamenwatch",
-        rbf="_Console/GnW",
-        setname="GameNWatch",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin",),
-        prefix_in_core="nointro",
-    ),
-    "gamegear": SystemProfile(
-        system="gamegear",
-        rbf="_Console/SMS",
-        setname="GameGear",
-        file_delay=1,
-        file_index=2,
-        file_type="f",
-        exts=(".gg",),
-        prefix_in_core="nointro",
-    ),
-    "gba2p": SystemProfile(
-        system="gba2p",
-        rbf="_Console/GBA2P",
-        setname="GBA2P",
-        file_delay=2,
-        file_index=0,
-        file_type="f",
-        exts=(".gba",),
-        prefix_in_core="nointro",
-    ),
-    "gba": SystemProfile(
-        system="gba",
-        rbf="_Console/GBA",
-        setname="GBA",
-        file_delay=2,
-        file_index=1,
-        file_type="f",
-        exts=(".gba",),
-        prefix_in_core="nointro",
-    ),
-    "megadrive": SystemProfile(
-        system="megadrive",
-        rbf="_Console/MegaDrive",
-        setname="MegaDrive",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin", ".gen", ".md"),
-        prefix_in_core="nointro",
-    ),
-    "genesis": SystemProfile(
-        system="genesis",
-        rbf="_Console/Genesis",
-        setname="Genesis",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin", ".gen", ".md"),
-        prefix_in_core="nointro",
-    ),
-    "intellivision": SystemProfile(
-        system="intellivision",
-        rbf="_Console/Intellivision",
-        setname="Intellivision",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".rom", ".int", ".bin"),
-        prefix_in_core="nointro",
-    ),
-    "megacd": SystemProfile(
-        system="megacd",
-        rbf="_Console/MegaCD",
-        setname="MegaCD",
-        file_delay=1,
-        file_index=0,
-        file_type="s",
-        exts=(".cue", ".chd"),
-        prefix_in_core="nointro",
-    ),
-    "n64": SystemProfile(
-        system="n64",
-        rbf="_Console/N64",
-        setname="N64",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".n64", ".z64"),
-        prefix_in_core="nointro",
-    ),
-    "neogeocd": SystemProfile(
-        system="neogeocd",
-        rbf="_Console/NeoGeo",
-        setname="NeoGeo-CD",
-        file_delay=1,
-        file_index=1,
-        file_type="s",
-        exts=(".cue", ".chd"),
-        prefix_in_core="nointro",
-    ),
-    "neogeo": SystemProfile(
-        system="neogeo",
-        rbf="_Console/NeoGeo",
-        setname="NeoGeo",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".neo",),
-        prefix_in_core="nointro",
-    ),
-    "nes": SystemProfile(
-        system="nes",
-        rbf="_Console/NES",
-        setname="NES",
-        file_delay=2,
-        file_index=1,
-        file_type="f",
-        exts=(".nes", ".fds", ".nsf"),
-        prefix_in_core="nointro",
-    ),
-    "odyssey2": SystemProfile(
-        system="odyssey2",
-        rbf="_Console/Odyssey2",
-        setname="ODYSSEY2",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin",),
-        prefix_in_core="nointro",
-    ),
-    "psx": SystemProfile(
-        system="psx",
-        rbf="_Console/PSX",
-        setname="PSX",
-        file_delay=1,
-        file_index=1,
-        file_type="s",
-        exts=(".cue", ".chd"),
-        prefix_in_core="nointro",
-    ),
-    "pocketchallengev2": SystemProfile(
-        system="pocketchallengev2",
-        rbf="_Console/WonderSwan",
-        setname="PocketChallengeV2",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".pc2",),
-        prefix_in_core="nointro",
-    ),
-    "pokemonmini": SystemProfile(
-        system="pokemonmini",
-        rbf="_Console/PokemonMini",
-        setname="PokemonMini",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".min",),
-        prefix_in_core="nointro",
-    ),
-    "saturn": SystemProfile(
-        system="saturn",
-        rbf="_Console/Saturn",
-        setname="Saturn",
-        file_delay=1,
-        file_index=0,
-        file_type="s",
-        exts=(".cue", ".chd"),
-        prefix_in_core="nointro",
-    ),
-    "s32x": SystemProfile(
-        system="s32x",
-        rbf="_Console/S32X",
-        setname="S32X",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".32x",),
-        prefix_in_core="nointro",
-    ),
-    "sg1000": SystemProfile(
-        system="sg1000",
-        rbf="_Console/ColecoVision",
-        setname="SG1000",
-        file_delay=1,
-        file_index=2,
-        file_type="f",
-        exts=(".sg",),
-        prefix_in_core="nointro",
-    ),
-    "sgb": SystemProfile(
-        system="sgb",
-        rbf="_Console/SGB",
-        setname="SGB",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".gb", ".gbc"),
-        prefix_in_core="nointro",
-    ),
-    "sms": SystemProfile(
-        system="sms",
-        rbf="_Console/SMS",
-        setname="SMS",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".sms", ".sg", ".gg"),
-        prefix_in_core="nointro",
-        slots=(
-            Slot(
-                exts=(".sms", ".sg"),
-                files=(FileEntry(delay=1, file_type="f", index=1),),
-            ),
-            Slot(
-                exts=(".gg",),
-                files=(FileEntry(delay=1, file_type="f", index=2),),
+BUILTIN_PROFILES = Path(__file__).with_name("profiles.json")
+
+ProfileRegistry = Mapping[str, SystemProfile]
+
+
+class ProfileError(SystemExit):
+    def __init__(self, source: Path, where: str, problem: str):
+        super().__init__(f"[ERR] profiles {source}: {where}: {problem}")
+
+
+def normalize_ext(ext: str) -> str:
+    e = (ext or "").strip().lower()
+    return e if e.startswith(".") else f".{e}"
+
+
+class _Reader:
+    """Validates one profiles file and builds the dataclasses from it."""
+
+    PROFILE_KEYS = {
+        "rbf",
+        "setname",
+        "file_delay",
+        "file_index",
+        "file_type",
+        "exts",
+        "prefix_in_core",
+        "slots",
+        "header",
+    }
+    REQUIRED = ("rbf", "setname", "file_delay", "file_index", "file_type", "exts")
+
+    def __init__(self, source: Path, headers: Mapping[str, HeaderRule]):
+        self.source = source
+        self.headers = dict(headers)
+
+    def fail(self, where: str, problem: str) -> ProfileError:
+        return ProfileError(self.source, where, problem)
+
+    def field(self, d: Mapping[str, Any], key: str, kind: type, where: str) -> Any:
+        value = d.get(key)
+        if not isinstance(value, kind) or isinstance(value, bool) and kind is int:
+            raise self.fail(where, f"{key!r} must be a {kind.__name__}")
+        return value
+
+    def exts(self, d: Mapping[str, Any], where: str) -> tuple[str, ...]:
+        exts = d.get("exts")
+        if not exts or not isinstance(exts, list):
+            raise self.fail(where, "'exts' must be a non-empty list")
+        if not all(isinstance(e, str) and e.strip(".") for e in exts):
+            raise self.fail(where, "'exts' entries must be extensions like '.md'")
+        return tuple(normalize_ext(e) for e in exts)
+
+    def header(self, value: Any, where: str) -> HeaderRule | None:
+        if value is None:
+            return None
+        if isinstance(value, str):
+            if value not in self.headers:
+                raise self.fail(where, f"unknown header {value!r}")
+            return self.headers[value]
+        if not isinstance(value, dict) or set(value) - {
+            "size",
+            "magic",
+            "offset",
+            "modulo",
+        }:
+            raise self.fail(where, "header must be a name or {size, magic, ...}")
+        magic = value.get("magic", [])
+        if not isinstance(magic, list) or not all(isinstance(m, str) for m in magic):
+            raise self.fail(where, "header 'magic' must be a list of strings")
+        return HeaderRule(
+            size=self.field(value, "size", int, where),
+            # Magic strings hold raw bytes (\\u001a etc.), one per code point.
+            magic=tuple(m.encode("latin-1") for m in magic),
+            offset=int(value.get("offset", 0)),
+            modulo=int(value.get("modulo", 0)),
+        )
+
+    def slot(self, d: Any, where: str) -> Slot:
+        if not isinstance(d, dict) or set(d) - {"exts", "files", "header"}:
+            raise self.fail(where, "slot must be {exts, files[, header]}")
+        files = d.get("files")
+        if not files or not isinstance(files, list):
+            raise self.fail(where, "'files' must be a non-empty list")
+        entries = []
+        for i, f in enumerate(files):
+            fwhere = f"{where}.files[{i}]"
+            if not isinstance(f, dict) or set(f) - {"delay", "type", "index", "path"}:
+                raise self.fail(fwhere, "file must be {delay, type, index[, path]}")
+            path = f.get("path")
+            if path is not None and not isinstance(path, str):
+                raise self.fail(fwhere, "'path' must be a string")
+            entries.append(
+                FileEntry(
+                    delay=self.field(f, "delay", int, fwhere),
+                    file_type=self.field(f, "type", str, fwhere),
+                    index=self.field(f, "index", int, fwhere),
+                    path=path,
+                )
+            )
+        return Slot(
+            exts=self.exts(d, where),
+            files=tuple(entries),
+            header=self.header(d.get("header"), where),
+        )
+
+    def profile(self, name: str, d: Any) -> SystemProfile:
+        if not isinstance(d, dict):
+            raise self.fail(name, "profile must be an object")
+        unknown = set(d) - self.PROFILE_KEYS
+        if unknown:
+            raise self.fail(name, f"unknown keys {sorted(unknown)}")
+        for key in self.REQUIRED:
+            if key not in d:
+                raise self.fail(name, f"missing {key!r}")
+        slots = d.get("slots")
+        if slots is not None and (not isinstance(slots, list) or not slots):
+            raise self.fail(name, "'slots' must be a non-empty list")
+        return SystemProfile(
+            system=name,
+            rbf=self.field(d, "rbf", str, name),
+            setname=self.field(d, "setname", str, name),
+            file_delay=self.field(d, "file_delay", int, name),
+            file_index=self.field(d, "file_index", int, name),
+            file_type=self.field(d, "file_type", str, name),
+            exts=self.exts(d, name),
+            prefix_in_core=d.get("prefix_in_core", "nointro"),
+            slots=(
+                tuple(self.slot(s, f"{name}.slots[{i}]") for i, s in enumerate(slots))
+                if slots
+                else None
             ),
-        ),
-    ),
-    "snes": SystemProfile(
-        system="snes",
-        rbf="_Console/SNES",
-        setname="SNES",
-        file_delay=2,
-        file_index=0,
-        file_type="f",
-        exts=(".sfc", ".smc", ".bin", ".bs"),
-        prefix_in_core="nointro",
-    ),
-    "supervision": SystemProfile(
-        system="supervision",
-        rbf="_Console/SuperVision",
-        setname="SuperVision",
-        file_delay=1,
-        file_index=1,
-        file_type="s",
-        exts=(".bin", ".sv"),
-        prefix_in_core="nointro",
-    ),
-    "tgfx16cd": SystemProfile(
-        system="tgfx16cd",
-        rbf="_Console/TurboGrafx16",
-        setname="TGFX16-CD",
-        file_delay=1,
-        file_index=0,
-        file_type="s",
-        exts=(".cue", ".chd"),
-        prefix_in_core="nointro",
-    ),
-    "tgfx16": SystemProfile(
-        system="tgfx16",
-        rbf="_Console/TurboGrafx16",
-        setname="TGFX16",
-        file_delay=1,
-        file_index=0,
-        file_type="f",
-        exts=(".pce", ".bin"),
-        prefix_in_core="nointro",
-    ),
-    "vc4000": SystemProfile(
-        system="vc4000",
-        rbf="_Console/VC4000",
-        setname="VC4000",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".bin",),
-        prefix_in_core="nointro",
-    ),
-    "vectrex": SystemProfile(
-        system="vectrex",
-        rbf="_Console/Vectrex",
-        setname="VECTREX",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".ovr", ".vec", ".bin", ".rom"),
-        prefix_in_core="nointro",
-    ),
-    "wonderswan": SystemProfile(
-        system="wonderswan",
-        rbf="_Console/WonderSwan",
-        setname="WonderSwan",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".wsc", ".ws"),
-        prefix_in_core="nointro",
-    ),
-    "wonderswancolor": SystemProfile(
-        system="wonderswancolor",
-        rbf="_Console/WonderSwan",
-        setname="WonderSwanColor",
-        file_delay=1,
-        file_index=1,
-        file_type="f",
-        exts=(".wsc",),
-        prefix_in_core="nointro",
-    ),
-}
+            header=self.header(d.get("header"), name),
+        )
+
+    def read(self) -> Tuple[Dict[str, HeaderRule], Dict[str, SystemProfile]]:
+        try:
+            data = json.loads(self.source.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise self.fail("file", str(e))
+        if not isinstance(data, dict) or set(data) - {"headers", "profiles"}:
+            raise self.fail("file", "expected {headers, profiles}")
+        for name, rule in (data.get("headers") or {}).items():
+            self.headers[name] = self.header(rule, f"headers.{name}")
+        profiles = {
+            name: self.profile(name, d)
+            for name, d in (data.get("profiles") or {}).items()
+        }
+        return self.headers, profiles
+
+
+def load_profiles(extra_dirs: Iterable[Path] = ()) -> ProfileRegistry:
+    """
+    The built-in profiles.json, then every *.json in `extra_dirs` in name
+    order; later files may use headers defined by earlier ones and replace
+    profiles of the same name. Returns a read-only mapping.
+    """
+    sources = [BUILTIN_PROFILES]
+    for d in extra_dirs:
+        if not d.is_dir():
+            raise SystemExit(f"[ERR] Profiles dir not found: {d}")
+        sources.extend(sorted(d.glob("*.json")))
+
+    headers: Dict[str, HeaderRule] = {}
+    profiles: Dict[str, SystemProfile] = {}
+    for source in sources:
+        headers, found = _Reader(source, headers).read()
+        profiles.update(found)
+    return MappingProxyType(profiles)
+
+
+PROFILES: ProfileRegistry = load_profiles()
+
+
+class SlotTable:
+    """
+    A run's slots compiled for per-file dispatch: extension -> (slot index,
+    MGL template with rbf, setname and prefix already rendered). Built once
+    per SystemConfig.
+    """
+
+    def __init__(
+        self, slots: Iterable[Slot], rbf: str, setname: str, prefix_in_core: str
+    ):
+        self.slots = tuple(slots)
+        self.templates: Tuple[MglTemplate, ...] = tuple(
+            compile_mgl(
+                rbf,
+                setname,
+                [(f.delay, f.file_type, f.index, f.path) for f in slot.files],
+                prefix=f"{prefix_in_core}/",
+            )
+            for slot in self.slots
+        )
+        by_ext: Dict[str, int] = {}
+        for i, slot in enumerate(self.slots):
+            for ext in slot.exts:
+                by_ext.setdefault(ext, i)
+        self.by_ext: Mapping[str, int] = MappingProxyType(by_ext)
+
+    def index_for(self, suffix: str) -> int:
+        """First slot listing `suffix`; slot 0 for anything else."""
+        return self.by_ext.get(suffix.lower(), 0)
+
+    def render(self, index: int, rel_inside_romdir: str) -> str:
+        return self.templates[index].render(rel_inside_romdir)
@@ -0,0 +1,277 @@
+"""
+Library-wide report from the hash cache and the CSVs, without reading ROMs:
+
+    --report library.json \\
+        --report-system genesis genesis.csv /media/fat/games/Genesis/nointro \\
+        --report-system snes snes.csv /media/fat/games/SNES/nointro
+
+- duplicates: the same content (headerless digest where there is one)
+  stored as more than one physical file, within or across systems.
+  Hardlinks and bind-mount aliases (same device + inode) are one file.
+- misplaced: ROMs stored under one system's romdir that its CSV does not
+  know but another system's CSV does.
+- coverage: per system and facet bucket (publisher, genre... from
+  --facets), how many CSV entries the system's romdir holds.
+
+Cache rows are assigned to a system by path prefix; rows outside every
+romdir are ignored. The cache is never pruned, so a row for a file
+deleted since it was hashed still counts.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence, Set, Tuple
+
+from .cachestore import CacheRow, detect_backend, open_backend
+from .config import SystemConfig
+from .csvdb import GameMeta
+from .facets import buckets_for
+from .organizer import open_db
+
+
+@dataclass(frozen=True)
+class ReportSystem:
+    name: str
+    romdir: Path
+    db: Mapping[str, GameMeta]
+
+
+def content_key(row: CacheRow) -> str:
+    """Headerless digest if the file had a header, else the whole-file SHA1."""
+    return row.sha1_nh or row.sha1
+
+
+def assign_rows(
+    rows: Sequence[CacheRow], systems: Sequence[ReportSystem]
+) -> Dict[str, List[CacheRow]]:
+    """Cache rows by system, using the longest romdir that contains the path."""
+    prefixes = sorted(
+        ((os.path.abspath(s.romdir) + os.sep, s.name) for s in systems),
+        key=lambda p: len(p[0]),
+        reverse=True,
+    )
+    by_system: Dict[str, List[CacheRow]] = {s.name: [] for s in systems}
+    for row in rows:
+        path = os.path.abspath(row.path)
+        for prefix, name in prefixes:
+            if path.startswith(prefix):
+                by_system[name].append(row)
+                break
+    return by_system
+
+
+def find_duplicates(by_system: Mapping[str, List[CacheRow]]) -> List[Dict[str, Any]]:
+    groups: Dict[str, List[Tuple[str, CacheRow]]] = defaultdict(list)
+    for name, rows in by_system.items():
+        for row in rows:
+            groups[content_key(row)].append((name, row))
+
+    out = []
+    for key, members in groups.items():
+        if len(members) < 2:
+            continue
+        files = {
+            (row.dev, row.ino) if row.ino else row.path for _, row in members
+        }
+        if len(files) < 2:
+            continue  # one file under several names
+        out.append(
+            {
+                "sha1": key,
+                "copies": len(files),
+                "wasted_bytes": members[0][1].size * (len(files) - 1),
+                "systems": sorted({name for name, _ in members}),
+                "paths": sorted(row.path for _, row in members),
+            }
+        )
+    out.sort(key=lambda d: (-d["wasted_bytes"], d["sha1"]))
+    return out
+
+
+def find_misplaced(
+    systems: Sequence[ReportSystem], by_system: Mapping[str, List[CacheRow]]
+) -> List[Dict[str, Any]]:
+    out = []
+    for system in systems:
+        for row in by_system[system.name]:
+            digests = {row.sha1, row.sha1_nh} - {None, ""}
+            if any(d in system.db for d in digests):
+                continue
+            matches = []
+            for other in systems:
+                if other is system:
+                    continue
+                meta = next((other.db[d] for d in digests if d in other.db), None)
+                if meta is not None:
+                    matches.append({"system": other.name, "title": meta.title})
+            if matches:
+                out.append(
+                    {"path": row.path, "stored_under": system.name, "matches": matches}
+                )
+    out.sort(key=lambda d: d["path"])
+    return out
+
+
+def coverage(
+    system: ReportSystem,
+    rows: Sequence[CacheRow],
+    facets: Sequence[str],
+    genre_depth: int,
+    date_depth: int,
+) -> Dict[str, List[Dict[str, Any]]]:
+    owned: Set[str] = set()
+    for row in rows:
+        owned.add(row.sha1)
+        if row.sha1_nh:
+            owned.add(row.sha1_nh)
+
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for facet in facets:
+        totals: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        for sha1, meta in system.db.items():
+            have = sha1 in owned
+            for parts in buckets_for(meta, facet, genre_depth, date_depth):
+                counts = totals["/".join(parts)]
+                counts[0] += 1
+                counts[1] += have
+        out[facet] = [
+            {
+                "bucket": bucket,
+                "entries": entries,
+                "owned": have,
+                "percent": round(have / entries * 100, 1),
+            }
+            for bucket, (entries, have) in sorted(totals.items())
+        ]
+    return out
+
+
+def build_report(
+    cfg: SystemConfig, systems: Sequence[ReportSystem]
+) -> Dict[str, Any]:
+    if not cfg.cache_path.exists():
+        raise SystemExit(f"[ERR] Cache not found: {cfg.cache_path}")
+    store = open_backend(
+        detect_backend(cfg.cache_path), cfg.cache_path, readonly=True
+    )
+    try:
+        rows = list(store.rows())
+    finally:
+        store.close()
+    by_system = assign_rows(rows, systems)
+
+    summary = {}
+    for system in systems:
+        own = by_system[system.name]
+        matched = sum(
+            1
+            for row in own
+            if row.sha1 in system.db or (row.sha1_nh and row.sha1_nh in system.db)
+        )
+        summary[system.name] = {
+            "romdir": str(system.romdir),
+            "files": len(own),
+            "matched": matched,
+            "db_entries": len(system.db),
+        }
+    return {
+        "cache": str(cfg.cache_path),
+        "cache_rows": len(rows),
+        "systems": summary,
+        "duplicates": find_duplicates(by_system),
+        "misplaced": find_misplaced(systems, by_system),
+        "coverage": {
+            s.name: coverage(
+                s, by_system[s.name], cfg.facets, cfg.genre_depth, cfg.date_depth
+            )
+            for s in systems
+        },
+    }
+
+
+def write_csv_tables(report: Dict[str, Any], out: Path) -> List[Path]:
+    """<stem>.duplicates.csv, <stem>.misplaced.csv and <stem>.coverage.csv."""
+    tables = {
+        "duplicates": (
+            ["sha1", "copies", "wasted_bytes", "systems", "path"],
+            [
+                [d["sha1"], d["copies"], d["wasted_bytes"], " ".join(d["systems"]), p]
+                for d in report["duplicates"]
+                for p in d["paths"]
+            ],
+        ),
+        "misplaced": (
+            ["path", "stored_under", "matches_system", "title"],
+            [
+                [d["path"], d["stored_under"], m["system"], m["title"]]
+                for d in report["misplaced"]
+                for m in d["matches"]
+            ],
+        ),
+        "coverage": (
+            ["system", "facet", "bucket", "entries", "owned", "percent"],
+            [
+                [name, facet, b["bucket"], b["entries"], b["owned"], b["percent"]]
+                for name, facets in report["coverage"].items()
+                for facet, buckets in facets.items()
+                for b in buckets
+            ],
+        ),
+    }
+    written = []
+    for table, (header, rows) in tables.items():
+        path = out.with_name(f"{out.stem}.{table}.csv")
+        with path.open("w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(header)
+            w.writerows(rows)
+        written.append(path)
+    return written
+
+
+def report_from_args(
+    cfg: SystemConfig, out: Path, configs: Sequence[SystemConfig]
+) -> int:
+    """
+    Report on `configs` (one per --report-system, each with its own CSV
+    and romdir; just `cfg` without any), reading the hash cache of `cfg`.
+    """
+    names = [c.system for c in configs]
+    if len(set(names)) != len(names):
+        raise SystemExit("[ERR] --report-system: each system may be given once.")
+
+    systems = [
+        ReportSystem(
+            c.system, c.romdir, open_db(replace(c, low_memory=False), verbose=False)
+        )
+        for c in configs
+    ]
+    report = build_report(cfg, systems)
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix.lower() == ".csv":
+        written = write_csv_tables(report, out)
+    else:
+        out.write_text(
+            json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
+        )
+        written = [out]
+
+    print(f"[REPORT] {report['cache_rows']:,} cache rows from {cfg.cache_path}")
+    for name, s in report["systems"].items():
+        print(
+            f"  {name:<12} files={s['files']:,}  matched={s['matched']:,}  "
+            f"db entries={s['db_entries']:,}"
+        )
+    print(f"  duplicates:  {len(report['duplicates']):,}")
+    print(f"  misplaced:   {len(report['misplaced']):,}")
+    print()
+    for path in written:
+        print(f"Wrote {path.resolve()}")
+    return 0
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# Listings of directories modified this recently are not persisted: on
+# filesystems with coarse timestamps (FAT: 2 s) a later change within the
+# same tick would leave the mtime unchanged.
+RACY_SECONDS = 2.0
+
+# Joins names in a stored listing; no file name can contain it.
+SEP = "/"
+
+# Bumped when what a stored listing contains changes; older rows are dropped.
+# 1: symlinked directories are no longer listed as subdirectories.
+LISTING_VERSION = 1
+
+
+class DirCache:
+    """
+    Directory listings (file and subdirectory names) persisted together with
+    the directory's mtime. Creating, removing or renaming an entry updates
+    its directory's mtime, so a directory whose mtime is unchanged since it
+    was last listed is served from here with a single stat() instead of
+    os.scandir; only changed directories are listed again.
+
+    Rows of directories not seen by a completed walk are pruned on close().
+    """
+
+    def __init__(self, db_path: Path, rescan: bool = False):
+        self.rescan = rescan  # list everything, only refresh the cache
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dirs(
+                path TEXT PRIMARY KEY,
+                mtime INTEGER NOT NULL,
+                files TEXT NOT NULL,
+                subdirs TEXT NOT NULL,
+                gen INTEGER NOT NULL
+            )
+        """)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != LISTING_VERSION:
+            self.conn.execute("DELETE FROM dirs")
+            self.conn.execute(f"PRAGMA user_version={LISTING_VERSION}")
+        row = self.conn.execute("SELECT MAX(gen) FROM dirs").fetchone()
+        self.gen = (row[0] or 0) + 1
+        self.unchanged = 0  # served from the cache
+        self.listed = 0  # listed with os.scandir
+
+    def listing(
+        self, path: str, mtime: Optional[int] = None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        (file names, subdirectory names) of `path`, in scandir order.
+        `mtime` is its st_mtime_ns if the caller already stat()ed it.
+        """
+        key = os.path.abspath(path)
+        if mtime is None:
+            mtime = os.stat(path).st_mtime_ns
+        row = None
+        if not self.rescan:
+            row = self.conn.execute(
+                "SELECT mtime, files, subdirs FROM dirs WHERE path=?", (key,)
+            ).fetchone()
+        if row is not None and row[0] == mtime:
+            self.unchanged += 1
+            self.conn.execute("UPDATE dirs SET gen=? WHERE path=?", (self.gen, key))
+            return _split(row[1]), _split(row[2])
+
+        self.listed += 1
+        files, subdirs = list_dir(path)
+        if time.time() - mtime / 1e9 >= RACY_SECONDS:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO dirs(path, mtime, files, subdirs, gen) "
+                "VALUES (?,?,?,?,?)",
+                (key, mtime, SEP.join(files), SEP.join(subdirs), self.gen),
+            )
+        return files, subdirs
+
+    def close(self, complete: bool = True) -> None:
+        if complete:
+            self.conn.execute("DELETE FROM dirs WHERE gen<>?", (self.gen,))
+        self.conn.commit()
+        self.conn.close()
+
+
+def _split(names: str) -> List[str]:
+    return names.split(SEP) if names else []
+
+
+def list_dir(path: str) -> Tuple[List[str], List[str]]:
+    """
+    (file names, subdirectory names) of `path`, in scandir order. Symlinks to
+    directories are neither, as with rglob: following them could loop.
+    """
+    files, subdirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    return files, subdirs
+
+
+def walk_files(
+    root: Path,
+    dirs: Optional[Dict[str, int]] = None,
+    dircache: Optional[DirCache] = None,
+) -> Iterator[str]:
+    """
+    Paths of the files under `root`, in the same order as `root.rglob("*")`,
+    found with os.scandir (or `dircache`). Only the directories still to
+    visit are held in memory, never the full listing. Visited directories
+    are recorded in `dirs` with their st_mtime_ns as of just before they
+    were listed, so a change made later in the run shows up as a new mtime.
+    """
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            mtime = os.stat(current).st_mtime_ns
+            if dircache is not None:
+                files, subdirs = dircache.listing(current, mtime)
+            else:
+                files, subdirs = list_dir(current)
+        except OSError:
+            continue
+        if dirs is not None:
+            dirs[current] = mtime
+        for name in files:
+            yield os.path.join(current, name)
+        stack.extend(os.path.join(current, d) for d in reversed(subdirs))
+
+
+def iter_candidates(
+    root: Path,
+    exts: Set[str],
+    ext_counts: Optional[Counter] = None,
+    dirs: Optional[Dict[str, int]] = None,
+    dircache: Optional[DirCache] = None,
+) -> Iterator[Path]:
+    """
+    Stream ROM candidates (files whose extension is in `exts`), counting
+    every file's extension into `ext_counts` along the way.
+    """
+    for path in walk_files(root, dirs, dircache):
+        suffix = Path(path).suffix.lower()
+        if ext_counts is not None:
+            ext_counts[suffix] += 1
+        if suffix in exts:
+            yield Path(path)
+
+
+class FileRecord(NamedTuple):
+    """One entry of a --files-from list; size/mtime when the list has them."""
+
+    path: Path
+    size: Optional[int] = None
+    mtime: Optional[float] = None
+
+
+def parse_file_record(record: str) -> FileRecord:
+    """
+    `PATH`, or `SIZE<TAB>MTIME<TAB>PATH` as written by
+    find -printf '%s\\t%T@\\t%p\\n'.
+    """
+    parts = record.split("\t", 2)
+    if len(parts) == 3 and parts[0].isdigit():
+        try:
+            return FileRecord(Path(parts[2]), int(parts[0]), float(parts[1]))
+        except ValueError:
+            pass
+    return FileRecord(Path(record))
+
+
+def read_file_list(
+    source: str, chunk_size: int = 64 * 1024
+) -> Iterator[FileRecord]:
+    """
+    Stream a file list from a path or "-" (stdin). Records are NUL-separated
+    if the first chunk contains a NUL byte (find -print0), else one per line.
+    """
+    f: BinaryIO
+    if source == "-":
+        f = sys.stdin.buffer
+    else:
+        try:
+            f = open(source, "rb")
+        except OSError as e:
+            raise SystemExit(f"[ERR] Cannot read --files-from {source}: {e}")
+    try:
+        sep = None
+        rest = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if sep is None:
+                sep = b"\0" if b"\0" in chunk else b"\n"
+            if not chunk:
+                break
+            records = (rest + chunk).split(sep)
+            rest = records.pop()
+            for record in records:
+                yield from _decoded(record)
+        yield from _decoded(rest)
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+def _decoded(record: bytes) -> Iterator[FileRecord]:
+    text = os.fsdecode(record.rstrip(b"\r"))
+    if text:
+        yield parse_file_record(text)
@@ -0,0 +1,330 @@
+"""
+Long-running mode: the CSV indexes and the hash cache stay loaded between
+requests, so frontends calling in after each download pay milliseconds
+instead of a full startup.
+
+Requests are JSON-RPC 2.0 objects, one per line, on a Unix socket; each
+gets one response line. Methods:
+
+    match_path  {"path": ...}   hash one ROM (through the cache), look it up
+    match_hash  {"sha1": ...}   look up a SHA1
+    organize    {"path": ...}   match one ROM and write its launchers
+    regenerate  {"force": bool} full run_system() with the warm indexes
+    ping, shutdown
+
+Every method also takes "system" (profile name, default --system) and
+"csv", "romdir", "outdir" to override the command line for that request.
+Connections are served one at a time (SQLite handles stay on one thread),
+so clients should close theirs when done.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from .config import SystemConfig
+from .csvdb import GameMeta, TitleIndex, build_title_index, lookup_title
+from .fingerprint import invalidate
+from .hashing import HashCache
+from .throttle import make_throttle
+from .organizer import (
+    NO_LAUNCHER,
+    PLANNED,
+    LauncherSink,
+    lookup_digests,
+    open_cache,
+    open_db,
+    render_mgl,
+    run_system,
+    slot_index_for,
+)
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+RUN_ERROR = -32000  # the tool itself refused ("[ERR] ...")
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class WarmDb:
+    """The CSV(s) of a config in memory, reloaded when any size or mtime changes."""
+
+    def __init__(self, cfg: SystemConfig):
+        # In memory even for --low-memory servers: lookups must not hit disk.
+        self.cfg = replace(cfg, low_memory=False)
+        self.signature: Optional[Tuple[Tuple[int, int], ...]] = None
+        self.db: Mapping[str, GameMeta] = {}
+        self._titles: Optional[TitleIndex] = None
+
+    def refresh(self) -> None:
+        signature = []
+        for path in self.cfg.csv_paths:
+            try:
+                st = path.stat()
+            except OSError:
+                raise SystemExit(f"[ERR] CSV not found: {path}")
+            signature.append((st.st_size, st.st_mtime_ns))
+        if tuple(signature) != self.signature:
+            self.db = open_db(self.cfg, verbose=False)
+            self._titles = None
+            self.signature = tuple(signature)
+            sources = ", ".join(map(str, self.cfg.csv_paths))
+            print(f"[SERVE] loaded {len(self.db):,} entries from {sources}")
+
+    def titles(self) -> TitleIndex:
+        if self._titles is None:
+            self._titles = build_title_index(self.db)
+        return self._titles
+
+
+class Server:
+    """Request dispatch over warm per-CSV databases and per-path hash caches."""
+
+    def __init__(self, make_config: Callable[[str], SystemConfig]):
+        self.make_config = make_config
+        self.configs: Dict[str, SystemConfig] = {}
+        self.dbs: Dict[Tuple[Path, ...], WarmDb] = {}
+        self.caches: Dict[Path, HashCache] = {}
+        self.stopping = False
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "ping": lambda params: "pong",
+            "match_path": self.match_path,
+            "match_hash": self.match_hash,
+            "organize": self.organize,
+            "regenerate": self.regenerate,
+            "shutdown": self.shutdown,
+        }
+
+    def config(self, params: Dict[str, Any]) -> SystemConfig:
+        system = str(params.get("system") or "")
+        if system not in self.configs:
+            self.configs[system] = self.make_config(system)
+        cfg = self.configs[system]
+        overrides: Dict[str, Any] = {
+            field: Path(params[key])
+            for key, field in (("romdir", "romdir"), ("outdir", "outdir"))
+            if params.get(key)
+        }
+        csvs = params.get("csv")
+        if csvs:
+            csvs = [Path(p) for p in ([csvs] if isinstance(csvs, str) else csvs)]
+            overrides.update(csv_path=csvs[0], more_csv_paths=csvs[1:])
+        return replace(cfg, **overrides) if overrides else cfg
+
+    def warm_db(self, cfg: SystemConfig) -> WarmDb:
+        key = tuple(p.resolve() for p in cfg.csv_paths)
+        if key not in self.dbs:
+            self.dbs[key] = WarmDb(cfg)
+        warm = self.dbs[key]
+        warm.refresh()
+        return warm
+
+    def cache(self, cfg: SystemConfig) -> HashCache:
+        key = cfg.cache_path.resolve()
+        if key not in self.caches:
+            self.caches[key] = open_cache(cfg, make_throttle(cfg))
+        return self.caches[key]
+
+    def close(self) -> None:
+        for cache in self.caches.values():
+            cache.close()
+        self.caches.clear()
+
+    # -- methods ---------------------------------------------------------
+
+    def _match(self, cfg: SystemConfig, rom: Path) -> Tuple[Dict[str, Any], Any]:
+        if not rom.is_file():
+            raise RpcError(INVALID_PARAMS, f"not a file: {rom}")
+        warm = self.warm_db(cfg)
+        slot_index = slot_index_for(cfg, rom.suffix)
+        slot = cfg.slots[slot_index]
+        result: Dict[str, Any] = {
+            "path": str(rom),
+            "system": cfg.system,
+            "slot": slot_index,
+            "sha1": None,
+            "headerless": None,
+            "matched_by": None,
+            "meta": None,
+        }
+        meta = None
+        if cfg.match_mode == "filename":
+            meta = lookup_title(warm.titles(), rom.stem)
+            if meta is not None:
+                result["matched_by"] = "filename"
+        if meta is None:
+            digests = self.cache(cfg).get_or_compute(rom, slot.header)
+            meta, stripped = lookup_digests(warm.db, digests)
+            result["sha1"] = digests.sha1
+            result["headerless"] = digests.headerless
+            if meta is not None:
+                result["matched_by"] = "headerless" if stripped else "sha1"
+        result["meta"] = asdict(meta) if meta else None
+        return result, meta
+
+    def match_path(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        cfg = self.config(params)
+        return self._match(cfg, Path(params["path"]))[0]
+
+    def match_hash(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        cfg = self.config(params)
+        meta = self.warm_db(cfg).db.get(str(params["sha1"]).strip().lower())
+        return asdict(meta) if meta else None
+
+    def organize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        cfg = self.config(params)
+        if cfg.max_per_folder:
+            raise RpcError(
+                RUN_ERROR,
+                "--max-per-folder shards whole folders; use regenerate instead",
+            )
+        rom = Path(params["path"])
+        try:
+            rel_inside_romdir = rom.relative_to(cfg.romdir).as_posix()
+        except ValueError:
+            raise RpcError(INVALID_PARAMS, f"{rom} is not under {cfg.romdir}")
+        result, meta = self._match(cfg, rom)
+        sink = LauncherSink(cfg)
+        mgl_text = render_mgl(cfg, result["slot"], rel_inside_romdir)
+        launchers = sink.plan(meta, rom, mgl_text)
+        written = 0
+        if cfg.dry_run:
+            status = PLANNED if launchers else NO_LAUNCHER
+        else:
+            status, written = sink.add(launchers)
+            sink.flush()
+            # The tree changed outside a full run.
+            invalidate(cfg)
+        result["targets"] = [str(x.folder / f"{x.name}.mgl") for x in launchers]
+        result["status"] = status
+        result["written"] = written
+        return result
+
+    def regenerate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        cfg = self.config(params)
+        if params.get("force"):
+            cfg = replace(cfg, force=True)
+        cache = self.cache(cfg)
+        cache.reset_stats()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            status = run_system(cfg, db=self.warm_db(cfg).db, cache=cache)
+        return {"status": status, "output": out.getvalue()}
+
+    def shutdown(self, params: Dict[str, Any]) -> str:
+        self.stopping = True
+        return "bye"
+
+    # -- protocol --------------------------------------------------------
+
+    def handle(self, line: bytes) -> Optional[Dict[str, Any]]:
+        """One request line in, one response object out (None for notifications)."""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return error_response(None, PARSE_ERROR, f"parse error: {e}")
+        if not isinstance(request, dict) or not isinstance(
+            request.get("method"), str
+        ):
+            return error_response(None, INVALID_REQUEST, "invalid request")
+
+        req_id = request.get("id")
+        method = self.methods.get(request["method"])
+        params = request.get("params") or {}
+        try:
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"unknown method: {request['method']}")
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params must be an object")
+            result = method(params)
+        except RpcError as e:
+            response = error_response(req_id, e.code, str(e))
+        except KeyError as e:
+            response = error_response(req_id, INVALID_PARAMS, f"missing param {e}")
+        except SystemExit as e:
+            response = error_response(req_id, RUN_ERROR, str(e.code))
+        except Exception as e:  # keep serving
+            response = error_response(req_id, INTERNAL_ERROR, repr(e))
+        else:
+            response = {"jsonrpc": "2.0", "id": req_id, "result": result}
+        return response if "id" in request else None
+
+
+def error_response(req_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": req_id,
+        "error": {"code": code, "message": message},
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        server: Server = self.server.app  # type: ignore[attr-defined]
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = server.handle(line)
+            if response is not None:
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            if server.stopping:
+                return
+
+
+def serve(socket_path: Path, make_config: Callable[[str], SystemConfig]) -> int:
+    """Serve requests on `socket_path` until a shutdown request or Ctrl-C."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("[ERR] --serve needs Unix domain sockets.")
+    if socket_path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()  # stale, left by a killed server
+        else:
+            raise SystemExit(f"[ERR] A server is already listening on {socket_path}")
+        finally:
+            probe.close()
+
+    app = Server(make_config)
+    # Load the default system up front so the first request is already warm.
+    cfg = app.config({})
+    app.warm_db(cfg)
+    app.cache(cfg)
+
+    listener = socketserver.UnixStreamServer(str(socket_path), _Handler)
+    listener.app = app  # type: ignore[attr-defined]
+    # Requests can write into outdir: owner only.
+    os.chmod(socket_path, 0o600)
+    print(f"[SERVE] listening on {socket_path} (system={cfg.system})")
+    # SIGTERM stops like Ctrl-C, so caches are closed (and logs compacted).
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while not app.stopping:
+            listener.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.server_close()
+        app.close()
+        socket_path.unlink(missing_ok=True)
+    print("[SERVE] stopped")
+    return 0
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List
+
+from .naming import Launcher
+from .util import menu_folder
+
+
+def initial_bucket(name: str) -> str:
+    """A-Z for Latin initials, 0-9 for digits, # for everything else."""
+    c = name[:1].upper()
+    if c.isdigit():
+        return "0-9"
+    if "A" <= c <= "Z":
+        return c
+    return "#"
+
+
+def range_labels(chunks: List[List[str]]) -> List[str]:
+    """
+    Label sorted chunks "Aa-Ba", "Bb-Ca", ... using the shortest prefix
+    length that keeps every label distinct as a folder name.
+    """
+    longest = max(len(n) for chunk in chunks for n in chunk)
+    for k in range(2, longest + 1):
+        labels = [f"{c[0][:k].title()}-{c[-1][:k].title()}" for c in chunks]
+        if len({menu_folder(label) for label in labels}) == len(labels):
+            return labels
+    return [
+        f"{c[0][:longest]}-{c[-1][:longest]} {i}" for i, c in enumerate(chunks, 1)
+    ]
+
+
+def shard_names(names: List[str], limit: int) -> List[str]:
+    """
+    Shard subfolder label for each name of an oversized folder, in order.
+    Names are grouped by initial; an initial that is still over the limit
+    is split further into alphabetical ranges. Repeated names (written as
+    __2, __3...) each count towards the limit.
+    """
+    groups: Dict[str, List[int]] = defaultdict(list)
+    for i in sorted(range(len(names)), key=lambda i: names[i].casefold()):
+        groups[initial_bucket(names[i])].append(i)
+
+    out = [""] * len(names)
+    for initial, group in groups.items():
+        if len(group) <= limit:
+            for i in group:
+                out[i] = initial
+            continue
+        chunks = [group[i : i + limit] for i in range(0, len(group), limit)]
+        labels = range_labels([[names[i] for i in chunk] for chunk in chunks])
+        for label, chunk in zip(labels, chunks):
+            for i in chunk:
+                out[i] = label
+    return out
+
+
+def shard_launchers(launchers: List[Launcher], limit: int) -> List[Launcher]:
+    """
+    Move the launchers of every folder holding more than `limit` of them
+    into _A, _B, ..., _0-9 (or _Aa-Ba style range) subfolders.
+    Folders within the limit are left untouched.
+    """
+    by_folder: Dict[Path, List[Launcher]] = defaultdict(list)
+    for launcher in launchers:
+        by_folder[launcher.folder].append(launcher)
+
+    out: List[Launcher] = []
+    for folder, group in by_folder.items():
+        if len(group) <= limit:
+            out.extend(group)
+            continue
+        labels = shard_names([launcher.name for launcher in group], limit)
+        out.extend(
+            replace(launcher, folder=folder / menu_folder(label))
+            for launcher, label in zip(group, labels)
+        )
+    return out
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import ctypes
+import os
+import platform
+import time
+from typing import Callable, Optional
+
+from .config import SystemConfig
+
+# Seconds of unused rate a bucket may save up, i.e. the largest burst.
+BURST_SECONDS = 0.25
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, at most BURST_SECONDS worth saved up.
+    take() never refuses: a request larger than what is available puts the
+    bucket in debt and sleeps until that debt is paid back, so a 1 MiB read
+    against a 64 KiB burst still averages out to `rate`.
+
+    `clock` and `sleep` are injectable so the schedule can be checked
+    without waiting (see bench.py --throttle).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = rate * BURST_SECONDS
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.last = clock()
+        self.waited = 0.0  # total seconds slept
+
+    def take(self, n: float) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= n
+        if self.tokens < 0:
+            delay = -self.tokens / self.rate
+            self.waited += delay
+            self.sleep(delay)
+
+
+class IoThrottle:
+    """
+    Read bandwidth (--max-read-mbps, in MB/s of 10**6 bytes) and operation
+    rate (--max-iops) limits shared by the hashing and writing stages.
+    Either limit may be 0 (off).
+    """
+
+    def __init__(
+        self,
+        max_read_mbps: float = 0,
+        max_iops: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.bytes = (
+            TokenBucket(max_read_mbps * 1_000_000, clock, sleep)
+            if max_read_mbps
+            else None
+        )
+        self.ops = TokenBucket(max_iops, clock, sleep) if max_iops else None
+
+    @property
+    def waited(self) -> float:
+        return sum(b.waited for b in (self.bytes, self.ops) if b is not None)
+
+    def read(self, nbytes: int) -> None:
+        """Account for one read of `nbytes`."""
+        if self.ops is not None:
+            self.ops.take(1)
+        if self.bytes is not None:
+            self.bytes.take(nbytes)
+
+    def op(self) -> None:
+        """Account for one metadata or write operation."""
+        if self.ops is not None:
+            self.ops.take(1)
+
+
+def make_throttle(cfg: SystemConfig) -> Optional[IoThrottle]:
+    if not cfg.max_read_mbps and not cfg.max_iops:
+        return None
+    return IoThrottle(cfg.max_read_mbps, cfg.max_iops)
+
+
+# ioprio_set(2) syscall numbers; Python has no wrapper for it.
+IOPRIO_SYSCALLS = {
+    "x86_64": 251,
+    "i386": 289,
+    "i686": 289,
+    "armv7l": 314,  # DE10-Nano
+    "aarch64": 30,
+    "riscv64": 30,
+}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+
+def lower_io_priority() -> bool:
+    """
+    Lowest CPU priority and, on Linux, the idle I/O class (as `ionice -c3`),
+    so the disk is only used when nobody else wants it. Returns whether the
+    I/O class could be set.
+    """
+    try:
+        os.nice(19)
+    except (AttributeError, OSError):
+        pass
+    nr = IOPRIO_SYSCALLS.get(platform.machine())
+    if platform.system() != "Linux" or nr is None:
+        return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        ret = libc.syscall(
+            nr,
+            IOPRIO_WHO_PROCESS,
+            0,
+            IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT,
+        )
+    except (OSError, AttributeError):
+        return False
+    return ret == 0
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+from itertools import islice
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
 
 
 INVALID_CHARS = ["<", ">", ":", '"', "/", "\\", "|", "?", "*"]
@@ -24,13 +28,28 @@ def truncate_filename(name: str, max_len: int = 160) -> str:
     return name if len(name) <= max_len else name[:max_len].rstrip()
 
 
-def unique_path(p: Path) -> Path:
-    if not p.exists():
+def unique_path(p: Path, exists: Callable[[Path], bool] = Path.exists) -> Path:
+    if not exists(p):
         return p
     stem, suf = p.stem, p.suffix
     i = 2
     while True:
         q = p.with_name(f"{stem}__{i}{suf}")
-        if not q.exists():
+        if not exists(q):
             return q
         i += 1
+
+
+def batched(items: Iterable[T], n: int) -> Iterator[List[T]]:
+    """Lists of up to n items; n <= 0 means a single batch of everything."""
+    it = iter(items)
+    if n <= 0:
+        batch = list(it)
+        if batch:
+            yield batch
+        return
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,209 @@
+"""
+Launcher writes, off the main thread.
+
+Which file a launcher ends up in (its name, or a __2, __3... suffix on a
+collision) is still decided on the calling thread, in order, so the tree
+is the same as from one-at-a-time writes. Only the writes themselves go to
+a thread pool, where each one is written to a hidden temporary name in the
+target folder and renamed into place: an interrupted run never leaves a
+truncated .mgl behind, and on network mounts the open/write/close round
+trips of many launchers overlap.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from .throttle import IoThrottle
+from .util import unique_path
+
+# Writes queued per thread before the caller waits for the oldest one.
+QUEUE_PER_THREAD = 32
+
+
+def write_atomic(target: Path, content: str, fsync: bool = False) -> None:
+    """Write `content` to a temporary sibling of `target`, then rename it."""
+    tmp = target.with_name(f".{target.name}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, target)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def fsync_dir(folder: Path) -> None:
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return  # Windows cannot open directories
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class LauncherWriter:
+    """
+    Writes .mgl files with the "suffix" / "skip-identical" collision rules.
+    `threads` <= 1 writes on the calling thread. With `fsync`, each file is
+    synced before its rename and each folder written to is synced once per
+    wait() or close(), instead of after every file.
+    """
+
+    def __init__(
+        self,
+        on_collision: str,
+        threads: int = 1,
+        fsync: bool = False,
+        throttle: Optional[IoThrottle] = None,
+    ):
+        self.on_collision = on_collision
+        self.fsync = fsync
+        self.throttle = throttle
+        self.pool = ThreadPoolExecutor(threads) if threads > 1 else None
+        self.limit = threads * QUEUE_PER_THREAD
+        # Writes not known to be finished, by case-folded path: the name is
+        # taken even though the file may not exist yet (and on a
+        # case-insensitive mount "Foo.mgl" takes "foo.mgl" as well).
+        self.inflight: Dict[str, Future] = {}
+        self.queue: Deque[Tuple[str, Future]] = deque()
+        self.folders: Set[Path] = set()
+        self.synced: Set[Path] = set()
+
+    def write(self, folder: Path, name: str, content: str) -> bool:
+        """
+        Write `folder`/`name`.mgl; returns True if a new file is (being)
+        written, False if an identical one was already there.
+        """
+        if self.throttle is not None:
+            self.throttle.op()
+        if folder not in self.folders:
+            folder.mkdir(parents=True, exist_ok=True)
+            self.folders.add(folder)
+        target = folder / f"{name}.mgl"
+
+        if self._exists(target):
+            if self.on_collision == "skip-identical":
+                try:
+                    if target.read_text(encoding="utf-8") == content:
+                        return False
+                except Exception:
+                    pass
+            target = unique_path(target, self._exists)
+
+        if self.pool is None:
+            write_atomic(target, content, self.fsync)
+        else:
+            key = str(target).casefold()
+            future = self.pool.submit(write_atomic, target, content, self.fsync)
+            self.inflight[key] = future
+            self.queue.append((key, future))
+            self._reap(block=len(self.queue) > self.limit)
+        if self.fsync:
+            self.synced.add(folder)
+        return True
+
+    def _exists(self, path: Path) -> bool:
+        pending = self.inflight.get(str(path).casefold())
+        if pending is not None:
+            # Same name (or same but for case) still being written: let it
+            # land so the check below sees it, as a sequential write would.
+            pending.result()
+        return path.exists()
+
+    def _reap(self, block: bool = False) -> None:
+        """Drop finished writes from the queue, re-raising their errors."""
+        while self.queue and (block or self.queue[0][1].done()):
+            key, future = self.queue.popleft()
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+            future.result()
+            block = False
+
+    def wait(self) -> None:
+        """Return once every write so far is on disk (and synced, with fsync)."""
+        while self.queue:
+            self._reap(block=True)
+        for folder in sorted(self.synced):
+            fsync_dir(folder)
+        self.synced.clear()
+
+    def close(self, cancel: bool = False) -> None:
+        """
+        Wait for every queued write (or, with `cancel`, only for those
+        already started) and sync the folders written to.
+        """
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=cancel)
+        if cancel:
+            self.queue.clear()
+            self.synced.clear()
+        else:
+            self.wait()
+        self.inflight.clear()
+
+
+def replace_tree(
+    staged: Path, outdir: Path, skip: Path, fsync: bool = False
+) -> Tuple[int, int]:
+    """
+    Make the launchers under `outdir` exactly those under `staged`: changed
+    or new ones are renamed into place, identical ones are left alone, and
+    every other .mgl (outside `skip`) is deleted along with folders that
+    end up empty. `staged` is removed. Returns (replaced, removed).
+    """
+    wanted: Set[Path] = set()
+    synced: Set[Path] = set()
+    replaced = removed = 0
+    for folder, _dirs, names in os.walk(staged):
+        for name in names:
+            src = Path(folder) / name
+            rel = src.relative_to(staged)
+            target = outdir / rel
+            wanted.add(rel)
+            try:
+                same = target.read_bytes() == src.read_bytes()
+            except OSError:
+                same = False
+            if same:
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, target)
+            synced.add(target.parent)
+            replaced += 1
+    shutil.rmtree(staged)
+
+    skip = skip.resolve()
+    for folder, dirs, names in os.walk(outdir, topdown=False):
+        here = Path(folder)
+        if here.resolve() == skip or skip in here.resolve().parents:
+            continue
+        for name in names:
+            path = here / name
+            if name.endswith(".mgl") and path.relative_to(outdir) not in wanted:
+                path.unlink()
+                synced.add(here)
+                removed += 1
+        if here != outdir and not any(here.iterdir()):
+            here.rmdir()
+            synced.add(here.parent)
+    if fsync:
+        for folder in sorted(synced):
+            if folder.exists():
+                fsync_dir(folder)
+    return replaced, removed